@@ -0,0 +1,109 @@
+"""Microbenchmark of the per-node `MessageDelayingBox` heaps (the former delaying boxes, polled by
+every node every round) against the shared `CalendarQueue` (only the due buckets are touched).
+Usage:
+
+    python scripts/benchmark_delay_queue.py [nodes] [messages_per_round] [rounds]
+
+e.g. `python scripts/benchmark_delay_queue.py 13 20 100000`
+"""
+import heapq
+import os.path
+import random
+import sys
+import time
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir))
+
+from simulation.messages import TAG_PAYLOAD, WrappedMessage
+from simulation.utils import CalendarQueue
+
+
+class MessageDelayingBox:
+    """The baseline: each node keeps its delayed messages in its own heap"""
+
+    class TimedEntry(object):
+
+        def __init__(self, deadline, msg):
+            self.deadline = deadline
+            self.msg = msg
+
+        def __lt__(self, other):
+            return self.deadline < other.deadline
+
+    def __init__(self):
+        self.pq = []  # [TimedEntry]
+
+    def add(self, sim, m):
+        heapq.heappush(self.pq, MessageDelayingBox.TimedEntry(sim.time + m.delay, m))
+
+    def pop_current_round(self, sim):
+        if len(self.pq) == 0 or self.pq[0].deadline > sim.time:
+            return []
+
+        this_round = []
+        while len(self.pq) > 0 and self.pq[0].deadline <= sim.time:
+            entry = heapq.heappop(self.pq)
+            this_round.append(entry.msg)
+
+        return this_round
+
+
+class _Sim:
+    def __init__(self, delta_ms):
+        self.time = 0
+        self.delta_ms = delta_ms
+
+
+class _Node:
+    def __init__(self):
+        self.released = 0
+
+    def release(self, sim, m):
+        self.released += 1
+
+
+def _messages(num_nodes, messages_per_round, rounds, seed=0):
+    """Pre-draws (node index, message) pairs for every round with exponential delays"""
+    r = random.Random(seed)
+    return [
+        [(r.randrange(num_nodes), WrappedMessage(None, TAG_PAYLOAD, None, delay=r.expovariate(1 / 333)))
+         for _ in range(messages_per_round)]
+        for _ in range(rounds)
+    ]
+
+
+def run_heaps(workload, num_nodes, delta_ms):
+    sim = _Sim(delta_ms)
+    boxes = [MessageDelayingBox() for _ in range(num_nodes)]
+    released = 0
+    for arrivals in workload:
+        for box in boxes:
+            released += len(box.pop_current_round(sim))
+        for idx, m in arrivals:
+            boxes[idx].add(sim, m)
+        sim.time += delta_ms
+    return released
+
+
+def run_calendar(workload, num_nodes, delta_ms):
+    sim = _Sim(delta_ms)
+    nodes = [_Node() for _ in range(num_nodes)]
+    queue = CalendarQueue()
+    for arrivals in workload:
+        queue.release(sim)
+        for idx, m in arrivals:
+            queue.add(sim, nodes[idx], m)
+        sim.time += delta_ms
+    return sum(node.released for node in nodes)
+
+
+if __name__ == "__main__":
+    num_nodes = int(sys.argv[1]) if len(sys.argv) > 1 else 13  # 3x3 mixes and 4 providers
+    messages_per_round = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    rounds = int(sys.argv[3]) if len(sys.argv) > 3 else 100_000
+    delta_ms = 10
+
+    workload = _messages(num_nodes, messages_per_round, rounds)
+    for name, run in (("MessageDelayingBox", run_heaps), ("CalendarQueue", run_calendar)):
+        started = time.time()
+        released = run(workload, num_nodes, delta_ms)
+        print("%-20s %6.2fs  (%d released)" % (name, time.time() - started, released))
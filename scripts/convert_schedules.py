@@ -0,0 +1,20 @@
+"""Converts the gzipped text schedules `input/schedules_*.txt.gz` once into the packed binary
+format (`input/schedules_*.bin`, see `read_packed_schedules`). Usage:
+
+    python scripts/convert_schedules.py [input_folder]
+"""
+import glob
+import os.path
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir))
+
+from simulation.utils import convert_compressed_to_packed_schedules
+
+
+if __name__ == "__main__":
+    folder = sys.argv[1] if len(sys.argv) > 1 else "input"
+
+    for compressed_filename in sorted(glob.glob(os.path.join(folder, "schedules_*.txt.gz"))):
+        packed_filename = compressed_filename[:-len(".txt.gz")] + ".bin"
+        convert_compressed_to_packed_schedules(compressed_filename, packed_filename)
+        print("%s -> %s" % (compressed_filename, packed_filename))
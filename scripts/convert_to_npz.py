@@ -30,12 +30,11 @@ def convert_to_nbz(filename):
 
     arrays['already_seen'] = np.array(sum([x for x in sim.output.already_seen.values()]))
 
-    # arrays['payload_buffer_levels'] = np.array(
-    #     [list(x) for _, x in sim.output.payload_buffer_levels.items()],
-    #     dtype='int32')
-    # arrays['payload_buffer_levels_t'] = np.array(
-    #     [t for t, _ in sim.output.payload_buffer_levels.items()],
-    #     dtype='int32')
+    # only sampled if the simulation was run with `sample_interval_ms` (and missing in older outputs)
+    levels = getattr(sim.output, 'payload_buffer_levels', {})
+    if levels:
+        arrays['payload_buffer_levels'] = np.array([list(x) for x in levels.values()], dtype='int32')
+        arrays['payload_buffer_levels_t'] = np.array(list(levels.keys()), dtype='int32')
 
     np.savez_compressed(filename, **arrays)
 
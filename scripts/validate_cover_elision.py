@@ -0,0 +1,70 @@
+"""Runs the same scenario with and without `elide_cover` and compares the payload e2e-delay
+distributions. Usage:
+
+    python scripts/validate_cover_elision.py [strategy_name] [m] [time_ms] [seeds]
+
+e.g. `python scripts/validate_cover_elision.py rollercoaster-k2-p1-timeout15 64 300000 3`
+"""
+import bisect
+import itertools
+import os.path
+import statistics
+import sys
+import time
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir))
+
+from simulation.messages import tag_name
+from simulation.notebook_utils import NotebookSimulationConfig, create_scenario
+
+
+def run(strategy_name, m, time_ms, seed, elide_cover):
+    config = NotebookSimulationConfig(
+        app_kwargs={'init_rate_per_second': 1 / 60},
+        sim_kwargs={'elide_cover': elide_cover})
+    sim = create_scenario(m, [m // 4] * 4, config, strategy_name, time_ms, seed=seed)
+    sim.output.log_level = 999
+
+    started = time.time()
+    sim.run(time_ms)
+    duration = time.time() - started
+
+    delays = [d for _, d in itertools.chain(*sim.output.e2e_delays.values())]
+    return delays, sim.output.elided_cover, duration
+
+
+def ks_statistic(a, b):
+    """Two-sample Kolmogorov-Smirnov statistic (max. distance of the empirical CDFs)"""
+    a, b = sorted(a), sorted(b)
+    return max(
+        abs(bisect.bisect_right(a, x) / len(a) - bisect.bisect_right(b, x) / len(b))
+        for x in a + b)
+
+
+def describe(delays):
+    s = sorted(delays)
+    p50, p95 = s[len(s) // 2], s[int(0.95 * (len(s) - 1))]
+    return "n=%6d  mean=%7.0f  p50=%7.0f  p95=%7.0f" % (len(s), statistics.mean(s), p50, p95)
+
+
+if __name__ == "__main__":
+    strategy_name = sys.argv[1] if len(sys.argv) > 1 else "rollercoaster-k2-p1-timeout15"
+    m = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    time_ms = int(sys.argv[3]) if len(sys.argv) > 3 else 300_000
+    seeds = int(sys.argv[4]) if len(sys.argv) > 4 else 3
+
+    results = {}
+    for elide_cover in (False, True):
+        delays, elided, duration = [], {}, 0
+        for seed in range(seeds):
+            d, e, t = run(strategy_name, m, time_ms, seed, elide_cover)
+            delays += d
+            duration += t
+            for tag, count in e.items():
+                elided[tag_name(tag)] = elided.get(tag_name(tag), 0) + count
+        results[elide_cover] = delays
+        print("elide_cover=%-5s %s  runtime=%6.1fs  elided=%s" % (elide_cover, describe(delays), duration, elided))
+
+    # with n samples each, a KS statistic below ~1.36 * sqrt(2 / n) is consistent at the 5% level
+    n = min(len(results[False]), len(results[True]))
+    print("KS statistic: %.4f (5%% critical value: %.4f)" % (
+        ks_statistic(results[False], results[True]), 1.36 * (2 / n) ** 0.5))
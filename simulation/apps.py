@@ -1,5 +1,5 @@
 from simulation.simulation import SimulationObject
-from simulation.utils import HasSeenSet
+from simulation.utils import FenwickTree, WindowedSeenSet
 
 
 class App(SimulationObject):
@@ -17,6 +17,7 @@ class App(SimulationObject):
         self.sim = sim
         self.group = group
         self.output = self.sim.output
+        self.rnd = sim.rnd.substream(self.stream_key())
 
         if multicast_factory:
             for user in self.group.users:
@@ -25,10 +26,14 @@ class App(SimulationObject):
         # these payload indicators are used to prevent counting re-transmitted
         # messages twice for E2E delay
         self.payload_nonce = 0
-        self.seen_deliveries = HasSeenSet()  # elements are tuples (receiver, counter)
+        self.seen_deliveries = WindowedSeenSet()  # elements are tuples (receiver, counter)
+
+    def stream_key(self):
+        # app names are not unique across groups (e.g. `create_scenario`)
+        return "%s/%s" % (self.name, self.group.id)
 
     def on_payload(self, recipient, msg, payload):
-        if not self.seen_deliveries.check_and_insert((recipient, payload.nonce)):
+        if not self.seen_deliveries.check_and_insert(recipient, payload.nonce):
             self.output.log_e2e_delay(
                 sim=self.sim,
                 msg=msg,
@@ -48,8 +53,11 @@ class App(SimulationObject):
     def tick(self, sim):
         pass  # can be optionally overridden
 
+    def next_wakeup(self, sim):
+        return None  # nothing to do unless `tick` is overridden
+
     def clean(self):
-        self.seen_deliveries = set()
+        self.seen_deliveries = WindowedSeenSet()
 
 
 class InteractiveApp(App):
@@ -70,8 +78,23 @@ class InteractiveApp(App):
         for heavy_user in users[:int(heavy_user_percentage/100*len(users))]:
             self.user_to_weight[heavy_user] = heavy_user_weight
 
+        # The weights of the online users (0 if offline) which are only updated when a user
+        # goes online or offline
+        self.user_index = {u: idx for idx, u in enumerate(users)}
+        self.online_weights = FenwickTree([self.user_to_weight[u] if u.online else 0 for u in users])
+        for u in users:
+            u.online_listeners.append(self)
+
+        self.process = None  # created on the first tick
+
+    def next_wakeup(self, sim):
+        return self.process.next_time if self.process else sim.time
+
     def tick(self, sim):
-        if self.sim.rnd.poisson_event(self.init_rate_per_second):
+        if self.process is None:
+            self.process = self.rnd.poisson_process(self.init_rate_per_second)
+
+        if self.process.fires(sim):
             sender = self._choose_online_sender()
             if sender and sender.online:
                 self.send_a_message(sender=sender)
@@ -79,16 +102,16 @@ class InteractiveApp(App):
     def send_a_message(self, sender):
         self.send_payload_to_group(sender, self._create_payload())
 
+    def on_online_changed(self, user):
+        self.online_weights.update(self.user_index[user], self.user_to_weight[user] if user.online else 0)
+
     def _choose_online_sender(self):
-        online_users = [u for u in self.group.users if u.online]
-        if len(online_users) == 0:
+        total = self.online_weights.total()
+        if total <= 0:
             return None
 
-        online_users = self.sim.rnd.shuffle(online_users)
-        online_users_weights = [self.user_to_weight[u] for u in online_users]
-
-        sender = self.sim.rnd.choice_with_weights(online_users, online_users_weights)
-        return sender
+        idx = self.online_weights.find(self.rnd.random() * total)
+        return self.group.users[idx]
 
 
 class InteractiveMultimessageApp(InteractiveApp):
@@ -1,7 +1,14 @@
 from simulation.multicast.base import SendingStrategy
-from simulation.messages import TAG_PAYLOAD, TAG_DROP, TAG_LOOP, create_wrapped_message, WrappedMessage, Message, wrap_messages_in_multi_message
-from simulation.simulation import SimulationObject, RecursiveSimulationObject, Simulation, SimulationOutput
-from simulation.utils import MessageDelayingBox, map_any_or_all
+from simulation.messages import TAG_PAYLOAD, TAG_DROP, TAG_LOOP, create_routed_message, CoverMessage, Message, \
+    wrap_messages_in_multi_message
+from simulation.simrandom import BACKEND_PYTHON, np
+from simulation.simulation import SimulationObject, RecursiveSimulationObject, Simulation, SimulationOutput, ENGINE_TICK
+from simulation.utils import schedule_transitions
+
+import bisect
+import collections
+import heapq
+import math
 
 
 class LoopixConfiguration():
@@ -31,93 +38,154 @@ class LoopixConfiguration():
 
 class MixNode(SimulationObject):
     """Mix nodes inject loop traffic (at `rate_loop` w/ `rate_loop_delay`). All
-    incoming messages are hold according to their `delay` field and then forwarded.
+    incoming messages are hold according to their `delay` field (in the simulation's
+    `delay_queue`) and then forwarded.
     """
 
     def __init__(self, name, layer_id, config):
         super().__init__(name)
-        self.inbox = MessageDelayingBox()
         self.layer_id = layer_id
 
         self.rate_loop = config.mix_rate_loop
         self.rate_delay = config.mix_rate_loop_delay
+        self.loop_process = None  # created on the first tick
+        self.loop_route = None  # layers of the loop path (set on the first loop)
 
     def deliver(self, sim, m):
-        self.inbox.add(sim, m)
+        sim.delay_queue.add(sim, self, m)
+
+    def deliver_many(self, sim, messages):
+        sim.delay_queue.add_many(sim, self, messages)
+
+    def release(self, sim, m):
+        """Called by the `delay_queue` once the delay of the message has passed"""
+        for m_ in m.forward():
+            sim.send(self, m_)
+
+    def next_wakeup(self, sim):
+        if self.loop_process is None:
+            return sim.time
+        return _earliest_wakeup(sim, self.loop_process.next_time)
 
     def tick(self, sim):
-        if sim.rnd.poisson_event(self.rate_loop):
-            self._send_loop(sim)
-            # continue as loops are independent of forwarding
+        if self.loop_process is None:
+            self.loop_process = self.rnd.poisson_process(self.rate_loop)
 
-        self.inbox.tick(sim)
-        this_round = self.inbox.pop_current_round(sim)
+        if self.loop_process.fires(sim):
+            if sim.elide_cover:
+                sim.output.log_elided_cover(TAG_LOOP)
+            else:
+                self._send_loop(sim)
 
-        for m in this_round:
-            if isinstance(m, WrappedMessage):
-                map_any_or_all(
-                    lambda m: sim.send(self, m),
-                    m.unwrap()
-                )
+    def skip_loops_until(self, sim, t):
+        """Advances the loop process to round `t` and returns the number of skipped loops"""
+        if self.loop_process is None:
+            self.loop_process = self.rnd.poisson_process(self.rate_loop)
+        return self.loop_process.skip_until(t, sim)
 
     def _send_loop(self, sim):
         # The mixes cannot reuse the `MixNetwork` random path method as
         # they need to route through the providers layer
-        network = sim.network
-        providers = sim.providers
+        if self.loop_route is None:
+            layers = sim.network.layers
+            self.loop_route = layers[self.layer_id + 1:] + [sim.providers] + layers[:self.layer_id]
 
-        path = []
-        for idx in range(self.layer_id + 1, len(network.layers)):
-            path.append(sim.rnd.choice(network.layers[idx]))
-
-        path.append(sim.rnd.choice(providers))
-
-        for idx in range(0, self.layer_id):
-            path.append(sim.rnd.choice(network.layers[idx]))
+        path = self.rnd.choice_each(self.loop_route)
         path.append(self)
 
-        m = create_wrapped_message(TAG_LOOP, "", path, self.rate_delay, sim)
+        m = create_routed_message(TAG_LOOP, "", path, self.rate_delay, sim, rnd=self.rnd)
         sim.send(self, m)
 
 
+class Postbox:
+    """The payloads a provider holds for one user as parallel lists of the delivery times and
+    the messages. Cover messages are not stored as users ignore them anyway. The times are
+    non-decreasing, hence the messages that arrived after some time are a suffix.
+    """
+    __slots__ = ('times', 'messages')
+
+    def __init__(self):
+        self.times = []
+        self.messages = []
+
+    def __len__(self):
+        return len(self.messages)
+
+    def append(self, time, m):
+        self.times.append(time)
+        self.messages.append(m)
+
+    def count_until(self, time):
+        """Returns the number of messages delivered at or before `time`"""
+        return bisect.bisect_right(self.times, time)
+
+    def clear(self):
+        self.times.clear()
+        self.messages.clear()
+
+
 class Provider(SimulationObject):
 
     def __init__(self, name):
         super().__init__(name)
-        self.inbox = MessageDelayingBox()
-        self.postboxes = {}  # user -> (time, message)
+        self.postboxes = {}  # user -> Postbox
+        self.drop_message = CoverMessage(self, TAG_DROP)  # shared by all senders
 
     def deliver(self, sim, m):
         if m.tag == TAG_DROP:
             return  # ignore drop messages early on
 
-        self.inbox.add(sim, m)
-
-    def tick(self, sim):
-        self.inbox.tick(sim)
-        this_round = self.inbox.pop_current_round(sim)
+        sim.delay_queue.add(sim, self, m)
 
-        for m in this_round:
-            m = m.unwrap()
+    def deliver_many(self, sim, messages):
+        sim.delay_queue.add_many(sim, self, [m for m in messages if m.tag != TAG_DROP])
 
-            u = m.recipient
+    def release(self, sim, m):
+        """Called by the `delay_queue` once the delay of the message has passed"""
+        for m_ in m.forward():
+            u = m_.recipient
             if isinstance(u, User):
-                self.postboxes[u].append((sim.time, m))
+                if m_.tag == TAG_PAYLOAD:
+                    self.postboxes[u].append(sim.time, m_)
 
             else:
                 # message to a mix node
-                sim.send(self, m)
+                sim.send(self, m_)
+
+    def next_wakeup(self, sim):
+        return None  # the delayed messages are released by the `delay_queue`
+
+    def tick(self, sim):
+        pass  # see `release()`
 
 
 _SECONDS_IN_DAY = 24*60*60
 
+# Placeholders that occupy a sending slot when cover traffic is elided (they are never sent)
+_ELIDED_DROP = CoverMessage(None, TAG_DROP)
+_ELIDED_LOOP = CoverMessage(None, TAG_LOOP)
+
+
+def _earliest_wakeup(sim, *times):
+    """Returns the first round at or after the earliest of the given times (`None` is ignored)"""
+    earliest = math.inf
+    for t in times:
+        if t is not None and t < earliest:
+            earliest = t
+
+    if earliest == math.inf:
+        return None
+    if earliest <= sim.time:
+        return sim.time
+    return sim.round_up_to_tick(earliest)
+
 
 class User(SimulationObject):
 
     def __init__(self, name, provider, mix_network, config, online_schedule=None):
         super().__init__(name)
         self.provider = provider
-        self.provider.postboxes[self] = []
+        self.provider.postboxes[self] = Postbox()
         self.mix_network = mix_network
 
         # app will add a new multicast strategy for their group id; the User object
@@ -126,7 +194,7 @@ class User(SimulationObject):
         self.multicast = dict()
 
         # sending properties
-        self.out_buffer = []
+        self.out_buffer = collections.deque()  # payloads waiting for a payload slot
         self.rate_payload = config.user_rate_payload
         self.rate_drop = config.user_rate_drop
         self.rate_loop = config.user_rate_loop
@@ -137,16 +205,27 @@ class User(SimulationObject):
         self.time_until_pull = self.time_between_pulls
 
         # for p-restricted multicast
-        self.waiting_for_split = []
+        self.waiting_for_split = collections.deque()
         self.split = 1  # might get updated from the sending strategy
+        self.loop_message = CoverMessage(self, TAG_LOOP)  # shared by all our loops
 
         # online schedule
         self.online = True
+        self.online_listeners = []  # notified on changes of `online` (see `set_online`)
         self.online_schedule = online_schedule
         if self.online_schedule:
             #opt assert len(self.online_schedule) == _SECONDS_IN_DAY
             self.online = self.online_schedule[0]
 
+        # Merged Poisson process for the payload, drop, and loop duties (created on the first tick)
+        self.duty_process = None
+
+        # event engine: the last round we were ticked while online (to catch up on the pull
+        # countdown for skipped rounds) and the next schedule change
+        self.last_online_tick = None
+        self._schedule_change = (None, None)  # (online state, time of next change)
+        self._schedule_transitions = (None, None)  # (schedule, see `schedule_transitions`)
+
     def add_multicast(self, multicast):
         self.multicast[multicast.group.id] = multicast
 
@@ -158,43 +237,116 @@ class User(SimulationObject):
         self.rate_loop *= split / self.split
         self.rate_payload *= split / self.split
         self.split = split
+        self.duty_process = None  # resampled with the new rates
 
     def schedule_for_send(self, application_message):
         #opt assert application_message.tag == TAG_PAYLOAD
         self.out_buffer.append(application_message)
 
+    def next_wakeup(self, sim):
+        schedule_change = self._next_schedule_change(sim)
+        if not self.online:
+            return schedule_change
+
+        if self.duty_process is None:
+            return sim.time
+
+        if len(self.waiting_for_split) >= self.split:
+            return sim.time
+
+        # the pull happens on the first online round on which `time_until_pull <= 0`
+        next_pull = self.last_online_tick + sim.delta_ms * max(
+            1, 1 + int(math.ceil(self.time_until_pull / sim.delta_ms)))
+
+        return _earliest_wakeup(
+            sim, schedule_change, next_pull,
+            self.duty_process.next_time,
+            *[multicast.next_wakeup(sim) for multicast in self.multicast.values()])
+
+    def _next_schedule_change(self, sim):
+        """Returns the first round at which the online schedule differs from `self.online`"""
+        if not self.online_schedule:
+            return None
+
+        online, t = self._schedule_change
+        if online == self.online and t > sim.time:
+            return t
+
+        schedule, transitions = self._schedule_transitions
+        if schedule is not self.online_schedule:
+            schedule = self.online_schedule
+            transitions = schedule_transitions(schedule)
+            self._schedule_transitions = (schedule, transitions)
+
+        ss = sim.time // 1_000
+        day, ss_of_day = divmod(ss, _SECONDS_IN_DAY)
+        if schedule[ss_of_day] != self.online:
+            s = ss
+        else:
+            idx = bisect.bisect_right(transitions, ss_of_day)
+            if idx < len(transitions):
+                s = day * _SECONDS_IN_DAY + transitions[idx]
+            elif schedule[0] != self.online:
+                s = (day + 1) * _SECONDS_IN_DAY
+            elif transitions:
+                s = (day + 1) * _SECONDS_IN_DAY + transitions[0]
+            else:
+                s = None
+
+        t = math.inf if s is None else max(sim.time, sim.round_up_to_tick(s * 1_000))
+        self._schedule_change = (self.online, t)
+        return t
+
     def tick(self, sim):
+        # The event engine skips (online) rounds without work, but the pull countdown still
+        # has to advance for each of them (no-op for the tick engine)
+        if self.last_online_tick is not None:
+            self.time_until_pull -= sim.time - self.last_online_tick - sim.delta_ms
+            self.last_online_tick = None
+
         # Skip all actions if we are offline
         if self.online_schedule:
             ss = (sim.time // 1_000) % _SECONDS_IN_DAY  # seconds since midnight
-            self.online = self.online_schedule[ss]
-            if self.online == False:
+            online = self.online_schedule[ss]
+            if online != self.online:
+                self.set_online(online)
+            if online == False:
                 return  # zZzZ
+        self.last_online_tick = sim.time
+
+        if self.duty_process is None:
+            self.duty_process = self.rnd.superposed_poisson_process(
+                (self.rate_payload, self.rate_drop, self.rate_loop))
 
         # DUTY: check inbox for messages
         if self.time_until_pull <= 0:
             self.time_until_pull = self.time_between_pulls
             #opt assert sim.delta_ms <= self.time_between_pulls
 
-            self._process_inbox(sim, self.provider.postboxes[self])
-            self.provider.postboxes[self] = []
+            postbox = self.provider.postboxes[self]
+            self._process_inbox(sim, postbox)
+            postbox.clear()
             # continue as pull is independent of the other processes
         self.time_until_pull -= sim.delta_ms
 
-        # DUTY: send payload/drop message if any
-        if sim.rnd.poisson_event(self.rate_payload):
-            if len(self.out_buffer) > 0:
-                self._send_payload(sim, self.out_buffer.pop(0))
-            else:
-                self._send_drop(sim)
+        fired = self.duty_process.fires(sim)
+        if fired:
+            payload_fired, drop_fired, loop_fired = fired
+
+            # DUTY: send payload/drop message if any
+            if payload_fired:
+                if len(self.out_buffer) > 0:
+                    self._send_payload(sim, self.out_buffer.popleft())
+                else:
+                    self._send_drop(sim)
 
-        # DUTY: send drop message if any
-        if sim.rnd.poisson_event(self.rate_drop):
-            self._send_drop(sim)
+            # DUTY: send drop message if any
+            if drop_fired:
+                self._send_drop(sim)
 
-        # DUTY: send loop message if any
-        if sim.rnd.poisson_event(self.rate_loop):
-            self._send_loop(sim)
+            # DUTY: send loop message if any
+            if loop_fired:
+                self._send_loop(sim)
 
         # DUTY: actually send out if we have at least `p` messages
         if len(self.waiting_for_split) >= self.split:
@@ -203,35 +355,54 @@ class User(SimulationObject):
         for multicast in self.multicast.values():
             multicast.tick(sim)
 
-    def _process_inbox(self, sim, inbox):
-        for delivery_time, m in inbox:
-            m.set_deliver_online_state(Message.DELIVERED_ONLINE if delivery_time >
-                                       sim.time - self.time_between_pulls else Message.DELIVERED_OFFLINE)
-            if m.tag == TAG_PAYLOAD:
-                self.multicast[m.group_id].on_receive(m)
-            else:
-                pass  # ignore DROP and LOOP messages
+    def set_online(self, online):
+        self.online = online
+        for listener in self.online_listeners:
+            listener.on_online_changed(self)
+
+    def _process_inbox(self, sim, postbox):
+        # payloads that arrived since the last pull were delivered while we were online
+        num_offline = postbox.count_until(sim.time - self.time_between_pulls)
+        multicast = self.multicast
+        for idx, m in enumerate(postbox.messages):
+            m.set_deliver_online_state(Message.DELIVERED_OFFLINE if idx < num_offline else Message.DELIVERED_ONLINE)
+            multicast[m.group_id].on_receive(m)
 
     def _send_loop(self, sim):
-        m = Message(recipient=self, tag=TAG_LOOP, body="",)
-        self.waiting_for_split.append(m)
+        if sim.elide_cover:
+            self.waiting_for_split.append(_ELIDED_LOOP)
+            return
+
+        self.waiting_for_split.append(self.loop_message)
 
     def _send_drop(self, sim):
-        provider = sim.rnd.choice(sim.providers)
-        m = Message(recipient=provider, tag=TAG_DROP, body="",)
-        self.waiting_for_split.append(m)
+        if sim.elide_cover:
+            self.waiting_for_split.append(_ELIDED_DROP)
+            return
+
+        provider = self.rnd.choice(sim.providers)
+        self.waiting_for_split.append(provider.drop_message)
 
     def _send_payload(self, sim, m):
         self.waiting_for_split.append(m)
 
     def _send_waiting_split_messages(self, sim):
-        # Pop top `split` messages of the list
-        messages = self.waiting_for_split[:self.split]
-        self.waiting_for_split = self.waiting_for_split[self.split:]
+        # Pop top `split` messages of the queue
+        popleft = self.waiting_for_split.popleft
+        messages = [popleft() for _ in range(self.split)]
 
         for m in messages:
             m.fire_callback_and_reset()
 
+        if sim.elide_cover:
+            # the slot is used as before, but only the payload branches are sent
+            for m in messages:
+                if m.tag != TAG_PAYLOAD:
+                    sim.output.log_elided_cover(m.tag)
+            messages = [m for m in messages if m.tag == TAG_PAYLOAD]
+            if not messages:
+                return
+
         multi_message = wrap_messages_in_multi_message(self, messages, sim)
 
         sim.send(
@@ -244,16 +415,103 @@ class User(SimulationObject):
 
     def clean(self):
         """Clear temporary state data"""
-        self.out_buffer = []
-        self.waiting_for_split = []
+        self.out_buffer.clear()
+        self.waiting_for_split.clear()
 
         self.online_schedule = None
-        self.online = True
+        self.set_online(True)
 
         for multicast in self.multicast.values():
             multicast.clean()
 
 
+class ParkingUserPopulation(RecursiveSimulationObject):
+    """Replaces the users in the object list of the tick engine and ticks them in their usual
+    order, except for offline users: they are parked after their first offline round and are
+    only ticked again once their schedule changes (see `User._next_schedule_change`). As the
+    `tick()` of an offline user does nothing, the results are identical to ticking all users.
+    """
+
+    def __init__(self, users):
+        super().__init__("Users", users)
+        self.active = list(range(len(users)))  # sorted indices of the users that are ticked
+        self.parked = []  # heap of (round of schedule change, index)
+
+    def tick(self, sim):
+        users, active, parked = self.objects, self.active, self.parked
+
+        while parked and parked[0][0] <= sim.time:
+            _, idx = heapq.heappop(parked)
+            bisect.insort(active, idx)
+
+        still_active = []
+        for idx in active:
+            user = users[idx]
+            user.tick(sim)
+            if user.online:
+                still_active.append(idx)
+            else:
+                t = user._next_schedule_change(sim)
+                if t != math.inf:
+                    heapq.heappush(parked, (t, idx))
+        self.active = still_active
+
+    def any_online(self):
+        return len(self.active) > 0
+
+    def clean(self):
+        for user in self.objects:
+            user.clean()
+
+
+class VectorizedUserPopulation(RecursiveSimulationObject):
+    """Replaces the users in the object list of the tick engine and only ticks the users that
+    have work to do in the current round (pull, payload/drop/loop duty, split, multicast timeout,
+    or schedule change). The next wakeups of all users (see `User.next_wakeup`) are kept in a
+    NumPy array so that the due users are found with a single array operation per round. Hence,
+    the cost grows with the number of events instead of the number of users.
+
+    The users are ticked on the same rounds and in the same order as by the event engine, and
+    therefore the results are identical to the plain tick engine.
+    """
+
+    def __init__(self, users):
+        super().__init__("Users", users)
+        if np is None:
+            raise ImportError("vectorized_users requires numpy")
+        self.wakeups = np.zeros(len(users))  # float as `inf` means never (everyone due at start)
+        self.ticked = []  # indices of users ticked in the previous round
+
+        # users only change their online state when ticked (they are woken at schedule changes)
+        self.was_online = [user.online for user in users]
+        self.num_online = sum(self.was_online)
+
+    def tick(self, sim):
+        users, wakeups = self.objects, self.wakeups
+
+        # The wakeups are refreshed at the start of the next round (i.e. after the delivery of
+        # the messages of the previous round) just like the event engine does
+        for idx in self.ticked:
+            t = users[idx].next_wakeup(sim)
+            wakeups[idx] = math.inf if t is None else t
+
+        self.ticked = np.flatnonzero(wakeups <= sim.time).tolist()
+        was_online = self.was_online
+        for idx in self.ticked:
+            user = users[idx]
+            user.tick(sim)
+            if user.online != was_online[idx]:
+                was_online[idx] = user.online
+                self.num_online += 1 if user.online else -1
+
+    def any_online(self):
+        return self.num_online > 0
+
+    def clean(self):
+        for user in self.objects:
+            user.clean()
+
+
 class LayeredMixNetwork(RecursiveSimulationObject):
 
     def __init__(self, num_layers, mix_per_layer, config):
@@ -294,23 +552,77 @@ def create_provider_with_users(provider_name, network, num_users, config, online
 
 class LoopixSimulation(Simulation):
 
-    def __init__(self, network, providers, users, output, delta_ms, config=None):
+    def __init__(self, network, providers, users, output, delta_ms, config=None, engine=ENGINE_TICK,
+                 random_backend=BACKEND_PYTHON, seed=0, vectorized_users=False, elide_cover=False,
+                 fast_forward=False, sample_interval_ms=None):
+        population = VectorizedUserPopulation(users) if vectorized_users else ParkingUserPopulation(users)
         super().__init__(
             "LOOPIX_SIM",
-            [network] + providers + users,
+            [network] + providers + [population],
             output,
-            delta_ms
+            delta_ms,
+            seed=seed,
+            engine=engine,
+            random_backend=random_backend,
+            sample_interval_ms=sample_interval_ms,
         )
         self.network = network
         self.providers = providers
         self.users = users
+        self.population = population
         self.apps = []
         self.config = config
 
+        # Only count the drop and loop messages instead of sending them (the sending slots of
+        # the users stay the same)
+        self.elide_cover = elide_cover
+
+        # Jump over rounds without online users (see `skip_idle_rounds`)
+        self.fast_forward = fast_forward
+
+    def skip_idle_rounds(self, max_rounds):
+        """Fast-forwards the tick engine while all users are offline and only cover traffic
+        is in flight. The clock jumps to the next wake-up of any user (i.e. schedule change)
+        or app, so none of their events is skipped. The in-flight cover messages are dropped
+        and the mix loops of the skipped rounds are not sent; both are only counted (see
+        `SimulationOutput.log_fast_forward`). Pending strategy timeouts do not matter as they
+        only fire while their user is online.
+        """
+        if not self.fast_forward or self.transit_recipients or self.population.any_online():
+            return 0
+
+        dropped = list(self.delay_queue.messages())
+        for m in dropped:
+            if m.tag != TAG_LOOP and m.tag != TAG_DROP:
+                return 0
+
+        target = self.time + max_rounds * self.delta_ms
+        for o in self._leaf_objects(self.objects):
+            if isinstance(o, MixNode):
+                continue
+            t = o.next_wakeup(self)
+            if t is not None and t < target:
+                target = t
+
+        if target <= self.time:
+            return 0
+
+        skipped_loops = sum(mix.skip_loops_until(self, target) for mix in self.network.objects)
+        self.output.log_fast_forward(skipped_loops, dropped)
+        self.delay_queue.clear()
+
+        skipped_rounds = (target - self.time) // self.delta_ms
+        self.time = target
+        return skipped_rounds
+
+    def sample(self, t):
+        self.output.log_payload_buffer_levels(t, [u.output_buffer_level() for u in self.users])
+
     def add_app(self, app):
         self.add_apps([app])
 
     def add_apps(self, apps):
+        # apps already have their random substream (see `App.__init__`)
         self.apps += apps
         self.objects += apps
 
@@ -324,7 +636,13 @@ def create_loopix_simulation(
         seed=0,
         config=LoopixConfiguration(),
         online_schedules=[],
-        delta_ms=1):
+        delta_ms=1,
+        engine=ENGINE_TICK,
+        random_backend=BACKEND_PYTHON,
+        vectorized_users=False,
+        elide_cover=False,
+        fast_forward=False,
+        sample_interval_ms=None):
     """Creates a 'random' loopix simulation including a network and providers with users.
 
     Keyword arguments:
@@ -333,10 +651,16 @@ def create_loopix_simulation(
     mix_layers -- Number of mix layers in the network
     mix_scale -- Number of mix nodes per layer
     output -- The gathering SimulationOutput object
-    seed -- Seed for the PRNG to allow for reproducible generation
+    seed -- Seed for the PRNG to allow for reproducible generation (and the master seed of the run)
     config -- Wrapping object for the different rates of this Loopix deployment
     online_schedules -- If set these online/offline schedules are each assigned to a user
     delta_ms -- The delta time used by the simulation
+    engine -- Either `ENGINE_TICK` (every object every round) or `ENGINE_EVENT` (only due objects)
+    random_backend -- Either `BACKEND_PYTHON` (`random.Random`) or `BACKEND_NUMPY` (pre-drawn blocks)
+    vectorized_users -- Only tick the due users (see `VectorizedUserPopulation`, requires NumPy)
+    elide_cover -- Count the drop and loop messages instead of sending them through the network
+    fast_forward -- Let the tick engine jump over rounds in which all users are offline
+    sample_interval_ms -- If set, log the payload buffer level of each user at this interval
     """
     import random as _pr
     random = _pr.Random(seed)
@@ -357,6 +681,10 @@ def create_loopix_simulation(
         providers.append(_p)
         users += _uu
 
-    sim = LoopixSimulation(network, providers, users, output, delta_ms, config)
+    sim = LoopixSimulation(
+        network, providers, users, output, delta_ms, config,
+        engine=engine, random_backend=random_backend, seed=seed, vectorized_users=vectorized_users,
+        elide_cover=elide_cover, fast_forward=fast_forward,
+        sample_interval_ms=sample_interval_ms)
 
     return sim
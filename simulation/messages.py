@@ -1,7 +1,21 @@
 from simulation import simrandom
 
-TAG_PAYLOAD, TAG_DROP, TAG_LOOP, TAG_MULTI = "payload", "drop", "loop", "multi"
+# Tags are small integers; their names are used for `repr` and for reading older pickles
+TAG_PAYLOAD, TAG_DROP, TAG_LOOP, TAG_MULTI = 0, 1, 2, 3
 VALID_TAGS = (TAG_PAYLOAD, TAG_DROP, TAG_LOOP, TAG_MULTI)
+TAG_NAMES = ("payload", "drop", "loop", "multi")
+
+
+def tag_name(tag):
+    """Returns the readable name of the tag (e.g. `"payload"`)"""
+    return TAG_NAMES[tag] if tag in VALID_TAGS else str(tag)
+
+
+def tag_from_name(name_or_tag):
+    """Returns the integer tag for a tag name (integer tags and `None` are returned as-is)"""
+    if isinstance(name_or_tag, str):
+        return TAG_NAMES.index(name_or_tag)
+    return name_or_tag
 
 
 def nop(*args, **kwargs):
@@ -16,6 +30,7 @@ class Message():
 
     The callback is called when it is send to the first hop from the client.
     """
+    __slots__ = ('recipient', 'tag', 'body', 'callback', '_delivery_online_state')
 
     DELIVERED_ONLINE = True
     DELIVERED_OFFLINE = False
@@ -31,20 +46,25 @@ class Message():
 
 
     def __repr__(self):
-        return "[%s, %s, %s]" % (self.recipient, self.tag, self.body)
+        return "[%s, %s, %s]" % (self.recipient, tag_name(self.tag), self.body)
 
     def __getstate__(self):
         """Exclude the callback from being "pickled" as the normal pickle cannot handle
         local lambda objects."""
-        return {'recipient': self.recipient, 'tag': self.tag, 'body': self.body}
+        return {name: getattr(self, name) for name in _state_slots(type(self)) if hasattr(self, name)}
 
     def __setstate__(self, d):
-        self.__dict__ = d
         self.callback = nop
+        self._delivery_online_state = None
+        for name, value in d.items():
+            setattr(self, name, value)
+        self.tag = tag_from_name(self.tag)  # older pickles use the tag names
 
     def fire_callback_and_reset(self):
-        self.callback(self)
-        self.callback = nop
+        callback = self.callback
+        if callback is not nop:
+            callback(self)
+            self.callback = nop
 
     def set_deliver_online_state(self, state):
         #opt assert state in (Message.DELIVERED_ONLINE, Message.DELIVERED_OFFLINE,)
@@ -60,6 +80,7 @@ class WrappedMessage(Message):
     they specify a delay $mu$ by which the message forwarding is delayed
     by mix nodes.
     """
+    __slots__ = ('delay',)
 
     def __init__(self, recipient, tag, body, delay=0):
         super().__init__(recipient, tag, body)
@@ -77,9 +98,17 @@ class WrappedMessage(Message):
         if isinstance(self.body, Message):
             self.body.set_deliver_online_state(state)
 
+    def forward(self):
+        """Returns the messages that the current hop sends on after the delay"""
+        body = self.body
+        if isinstance(body, list):
+            return body
+        return (body,) if isinstance(body, Message) else ()
+
 
 class WrappedMultiMessage(WrappedMessage):
     """A wrapped message containing multiple messages as its body."""
+    __slots__ = ()
 
     def __init__(self, recipient, tags, messages, delay=0):
         super().__init__(recipient, tags, body=messages, delay=delay)
@@ -88,30 +117,115 @@ class WrappedMultiMessage(WrappedMessage):
         return self.body
 
 
+class RoutedMessage(WrappedMessage):
+    """A flat alternative to the nested `WrappedMessage`s. The message holds the complete
+    `route` and the per-hop `delays` and is addressed to `route[hop]`. Instead of unwrapping
+    a new message at every hop, `forward()` advances the `hop` index in place. After the last
+    hop the `body` is sent on, or, if the body is a list of messages, the message fans out
+    (i.e. the last hop is the 'multiplier' node of a multi message).
+
+    `unwrap()` is an adapter returning the next hop's view (same recipient, tag, and delay as
+    the nested messages). Unlike the nested form, the `body` of every view is the final body
+    (or the list of branches before the fan-out) rather than the next wrapped message.
+    """
+    __slots__ = ('route', 'delays', 'hop')
+
+    def __init__(self, tag, body, route, delays, hop=0):
+        super().__init__(route[hop], tag, body, delays[hop])
+        self.route = route
+        self.delays = delays
+        self.hop = hop
+
+    def __repr__(self):
+        return "[%s, %.2fs, hop %d/%d, %s]" % (
+            self.recipient, self.delay / 1000, self.hop + 1, len(self.route), self.body)
+
+    def forward(self):
+        hop = self.hop + 1
+        if hop < len(self.route):
+            self.hop = hop
+            self.recipient = self.route[hop]
+            self.delay = self.delays[hop]
+            return (self,)
+        return super().forward()
+
+    def unwrap(self):
+        """Returns the message as seen by the next hop without advancing this message"""
+        hop = self.hop + 1
+        if hop < len(self.route):
+            return RoutedMessage(self.tag, self.body, self.route, self.delays, hop)
+        return self.body
+
+    def set_deliver_online_state(self, state):
+        super().set_deliver_online_state(state)
+
+        if isinstance(self.body, list):
+            for m in self.body:
+                m.set_deliver_online_state(state)
+
+
+class CoverMessage(Message):
+    """A drop or loop message with an empty body. As they carry no state, a single instance
+    per recipient and tag is shared by all senders (flyweight). Hence, they never change
+    after creation: there is no callback and the online state is not tracked.
+    """
+    __slots__ = ()
+
+    def __init__(self, recipient, tag):
+        super().__init__(recipient, tag, "")
+
+    def fire_callback_and_reset(self):
+        pass
+
+    def set_deliver_online_state(self, state):
+        pass
+
+
 class ApplicationMessage(Message):
     """Sub class for marking application messages"""
+    __slots__ = ('group_id',)
 
     def __init__(self, recipient, tag, body, group_id):
         super().__init__(recipient, tag, body)
         self.group_id = group_id
 
 
-def create_wrapped_message(tag, body, chain, rate_delay_per_seconds, sim):
+_STATE_SLOTS = {}  # class -> names of the pickled slots
+
+
+def _state_slots(cls):
+    """Returns the slots of the class and its bases (except the callback)"""
+    names = _STATE_SLOTS.get(cls)
+    if names is None:
+        names = tuple(
+            name
+            for c in reversed(cls.__mro__)
+            for name in c.__dict__.get('__slots__', ())
+            if name != 'callback')
+        _STATE_SLOTS[cls] = names
+    return names
+
+
+def create_wrapped_message(tag, body, chain, rate_delay_per_seconds, sim, rnd=None):
     """Creates a chain of `WrappedMessage(WrappedMessage( ...))` following the provided
     chain. The most inner message will be addressed to `chain[-1]` and contains the
-    `body`. All messages share the same `tag`.
+    `body`. All messages share the same `tag`. The delays are drawn from `rnd` which
+    defaults to the simulation's master stream.
     """
+    rnd = rnd if rnd else sim.rnd
+    delays = rnd.poisson_delays(rate_delay_per_seconds, len(chain) - 1)
     message = WrappedMessage(chain[-1], tag, body)
-    for recipient in chain[-2::-1]:
+    for recipient, delay in zip(chain[-2::-1], delays):
         message = WrappedMessage(
             recipient=recipient,
             tag=tag,
             body=message,
-            delay=sim.rnd.poisson_delay(rate_delay_per_seconds))
+            delay=delay)
     return message
 
 
-def create_wrapped_multi_message_multiple(chain_prefix, chain_suffixes, tags, bodies, rate_delay_per_seconds, sim):
+def create_wrapped_multi_message_multiple(chain_prefix, chain_suffixes, tags, bodies, rate_delay_per_seconds, sim,
+                                          rnd=None):
     """The resulting 'logical' messages $m_i$ have the chains $c_i = chain_prefix + chain_suffixes$.
     It is assumed that the message 'multiplies' at the last node of the chain_prefix.
     The messages of the prefix path have the `tags` list as their tag.
@@ -119,10 +233,11 @@ def create_wrapped_multi_message_multiple(chain_prefix, chain_suffixes, tags, bo
     """
     #opt assert len(bodies) == len(chain_suffixes)
     #opt assert len(tags) == len(chain_suffixes)
+    rnd = rnd if rnd else sim.rnd
 
     # different suffix parts are reduced to a normal wrapped message
     messages = [
-        create_wrapped_message(tag, body, chain, rate_delay_per_seconds, sim)
+        create_wrapped_message(tag, body, chain, rate_delay_per_seconds, sim, rnd)
         for body, tag, chain in zip(bodies, tags, chain_suffixes)
     ]
 
@@ -132,7 +247,7 @@ def create_wrapped_multi_message_multiple(chain_prefix, chain_suffixes, tags, bo
         recipient=multiplier_node,
         tags=TAG_MULTI,
         messages=messages,
-        delay=sim.rnd.poisson_delay(rate_delay_per_seconds))
+        delay=rnd.poisson_delay(rate_delay_per_seconds))
 
     # attach remaining prefix
     for recipient in chain_prefix[-2::-1]:
@@ -140,40 +255,84 @@ def create_wrapped_multi_message_multiple(chain_prefix, chain_suffixes, tags, bo
             recipient=recipient,
             tag=TAG_MULTI,
             body=message,
-            delay=sim.rnd.poisson_delay(rate_delay_per_seconds))
+            delay=rnd.poisson_delay(rate_delay_per_seconds))
 
     return message
 
 
+def create_routed_message(tag, body, chain, rate_delay_per_seconds, sim, rnd=None):
+    """Same as `create_wrapped_message`, but returns a single flat `RoutedMessage`"""
+    rnd = rnd if rnd else sim.rnd
+
+    # the delays are drawn from the inner to the outer message (as for the nested messages)
+    delays = rnd.poisson_delays(rate_delay_per_seconds, len(chain) - 1)
+    delays.reverse()
+    delays.append(0)
+    return RoutedMessage(tag, body, list(chain), delays)
+
+
+def create_routed_multi_message(chain_prefix, chain_suffixes, tags, bodies, rate_delay_per_seconds, sim, rnd=None):
+    """Same as `create_wrapped_multi_message_multiple`, but returns a flat `RoutedMessage` for
+    the prefix that fans out into one `RoutedMessage` per suffix at the multiplier node.
+    """
+    #opt assert len(bodies) == len(chain_suffixes)
+    #opt assert len(tags) == len(chain_suffixes)
+    rnd = rnd if rnd else sim.rnd
+
+    # All delays are drawn at once: first those of the suffixes (each from the inner to the
+    # outer message), then those of the prefix (as for the nested messages)
+    num_suffix_delays = sum(len(chain) - 1 for chain in chain_suffixes)
+    drawn = rnd.poisson_delays(rate_delay_per_seconds, num_suffix_delays + len(chain_prefix))
+
+    messages, pos = [], 0
+    for body, tag, chain in zip(bodies, tags, chain_suffixes):
+        end = pos + len(chain) - 1
+        delays = drawn[pos:end]
+        delays.reverse()
+        delays.append(0)
+        messages.append(RoutedMessage(tag, body, list(chain), delays))
+        pos = end
+
+    # the prefix fans out into the suffix messages at the 'multiplier' node
+    delays = drawn[pos:]
+    delays.reverse()
+    return RoutedMessage(TAG_MULTI, messages, list(chain_prefix), delays)
+
+
+def _last_mile(recipient):
+    """Users are reached via their provider (any other recipient directly)"""
+    provider = getattr(recipient, 'provider', None)
+    return [provider] if provider is not None else []
+
+
 def wrap_messages_in_multi_message(sender, messages, sim, multiplier_layer=2):
     """Takes the given messages and wraps them in a multi message that splits at `multiplier_layer`.
-    The prefix is randomly chosen from the network.
+    The prefix is randomly chosen from the network using the sender's random stream.
     """
     network = sender.mix_network  # This currently assumes a network layer depth of 3
+    rnd = sender.rnd
+    prefix_layers = network.layers[:multiplier_layer]
+    suffix_layers = network.layers[multiplier_layer:]
 
-    # Build a randomly chosen common chain "prefix"
-    chain_prefix_mixes = [
-        sim.rnd.choice(layer) for layer in network.layers[:multiplier_layer]
-    ]
-    chain_prefix = [sender.provider] + chain_prefix_mixes
+    # Draw the mixes of the common chain "prefix" and of the independent chain "suffixes" of
+    # each message/recipient at once (in this order)
+    mixes = rnd.choice_each(prefix_layers + suffix_layers * len(messages))
+    chain_prefix = [sender.provider] + mixes[:multiplier_layer]
 
-    # Build independent chain "suffixes" and for each message/recipient
     chain_suffixes = []
+    pos = multiplier_layer
     for m in messages:
-        chain_suffix_mixes = [
-            sim.rnd.choice(layer) for layer in network.layers[multiplier_layer:]
-        ]
-
-        last_mile = [m.recipient.provider] if hasattr(m.recipient, 'provider') else []
-
-        chain_suffix = chain_suffix_mixes + last_mile
+        chain_suffix = mixes[pos:pos + len(suffix_layers)]
+        pos += len(suffix_layers)
+        chain_suffix += _last_mile(m.recipient)
         chain_suffixes.append(chain_suffix)
 
-    return create_wrapped_multi_message_multiple(
+    return create_routed_multi_message(
         tags=[m.tag for m in messages],
         bodies=messages,
         chain_prefix=chain_prefix,
         chain_suffixes=chain_suffixes,
         rate_delay_per_seconds=sender.rate_delay,
         sim=sim,
+        rnd=rnd,
     )
@@ -6,6 +6,7 @@ class Group(object):
     def __init__(self, id, users):
         self.id = id
         self.users = users
+        self.schedule_cache = None  # shared by the strategies of the members (if they need one)
 
 
 def create_factory(cls, **p_kwargs):
@@ -40,6 +41,11 @@ class SendingStrategy(object):
     def tick(self, sim):  # pragma: no cover
         raise NotImplementedError("Not implemented")
 
+    def next_wakeup(self, sim):
+        """Returns the earliest time at which `tick` has work to do (or `None`). The owning
+        user is woken up accordingly by the event engine."""
+        return None
+
     def clean(self):
         # optional: clean temporary state before pickleing
         pass
@@ -1,7 +1,10 @@
 from simulation.messages import TAG_PAYLOAD, Message, ApplicationMessage
 from simulation.multicast.base import SendingStrategy
-from simulation.multicast.schedule import Schedule
-from simulation.utils import HasSeenSet
+from simulation.multicast.schedule import Schedule, ScheduleCache
+from simulation.utils import WindowedSeenSet
+
+import collections
+import heapq
 
 
 class RollercoasterMessage(ApplicationMessage):
@@ -9,6 +12,7 @@ class RollercoasterMessage(ApplicationMessage):
     or a `ACK` message as its body. It will be wrapped in `WrappedMessage`s when it's being
     sent.
     """
+    __slots__ = ('source', 'nonce', 'sender', 'role')
 
     ACK = "ACK"
 
@@ -53,16 +57,64 @@ class RollercoasterMessage(ApplicationMessage):
             str(self.body))
 
 
+class TimeoutManager(object):
+    """Keeps the timeouts of all sessions of a strategy ordered by their deadline (heap). Removed
+    entries are only marked and skipped once they reach the top of the heap (lazy deletion),
+    while the sessions index their entries by node and role.
+    """
+
+    def __init__(self):
+        self._heap = []  # (deadline, seq, TimeoutEntry)
+        self._seq = 0
+
+    def add(self, entry):
+        entry.seq = self._seq
+        self._seq += 1
+        heapq.heappush(self._heap, (entry.deadline, entry.seq, entry))
+
+    def _prune(self):
+        heap = self._heap
+        while heap and heap[0][2].removed:
+            heapq.heappop(heap)
+
+    def next_deadline(self):
+        self._prune()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_failed(self, t):
+        """Removes and returns all timeouts with a deadline until `t` in the order of their
+        sessions and, within a session, in the order they were set."""
+        self._prune()
+        heap = self._heap
+        if not heap or heap[0][0] > t:
+            return []
+
+        result = []
+        while heap and heap[0][0] <= t:
+            _, _, entry = heapq.heappop(heap)
+            entry.removed = True
+            entry.session._forget_timeout(entry)
+            result.append(entry)
+            self._prune()
+
+        result.sort(key=lambda entry: (entry.session.nonce, entry.seq))
+        return result
+
+
 class MessagingSession(object):
     STATE_IN_PROGRESS, STATE_DELIVERED = "IN_PROGRESS", "DELIVERED"
+    RETIRED_DELIVERED, RETIRED_EXPIRED = "DELIVERED", "EXPIRED"
 
     class TimeoutEntry():
 
-        def __init__(self, deadline, node, role):
+        def __init__(self, deadline, node, role, session=None):
             #opt assert deadline >= 0
             self.deadline = deadline
             self.node = node
             self.role = role
+            self.session = session
+            self.seq = 0  # set by the `TimeoutManager`
+            self.removed = False
 
         def __repr__(self):
             return "T[@%d,n=%s,r=%s)" % (int(self.deadline), self.node, self.role)
@@ -71,49 +123,56 @@ class MessagingSession(object):
             #opt assert type(self) == type(o)
             return self.deadline == o.deadline and self.node == o.node and self.role == o.role
 
-    def __init__(self, multicast, source, nonce, payload):
+    def __init__(self, multicast, source, nonce, payload, schedule=None, timeout_manager=None):
         self.source, self.nonce, self.payload = source, nonce, payload
         self.users, self.sim = multicast.group.users, multicast.sim
 
         self.state = {x: MessagingSession.STATE_IN_PROGRESS for x in self.users if x != source}
-        self.timeouts = []  # list of TimeoutEntry items
-        self.schedule = Schedule(self.source, self.users, multicast.k, self.nonce)
+        self.undelivered = len(self.state)  # members in `STATE_IN_PROGRESS`
+        self.unsent = 0  # messages to the direct children that are still queued at the source
+        self.created_at = self.sim.time
+        self.retired = False
+        self.timeouts = {}  # (node, role) -> [TimeoutEntry] (also kept by the `TimeoutManager`)
+        self.timeout_manager = timeout_manager if timeout_manager else TimeoutManager()
+        self.schedule = schedule if schedule else Schedule(self.source, self.users, multicast.k, self.nonce)
 
     def set_timeout(self, t_offset, node, role):
         # when setting a new timeout, there shouldn't be any existing one for this `node` and `role`
-        #opt assert not any(map(lambda entry: entry.node == node and entry.role == role, self.timeouts))
-
-        self.timeouts.append(MessagingSession.TimeoutEntry(self.sim.time + t_offset, node, role))
-
-    def get_failed_timeouts(self, remove):
-        # optimization: skip if no entry triggers their deadline
-        none_failed = True
-        for entry in self.timeouts:
-            if entry.deadline <= self.sim.time:
-                none_failed = False
-                break
-        if none_failed:
-            return []
+        #opt assert (node, role) not in self.timeouts
 
-        result = [entry for entry in self.timeouts if entry.deadline <= self.sim.time]
-        if remove:
-            self.timeouts = [entry for entry in self.timeouts if entry.deadline > self.sim.time]
-        return result
+        entry = MessagingSession.TimeoutEntry(self.sim.time + t_offset, node, role, session=self)
+        self.timeouts.setdefault((node, role), []).append(entry)
+        self.timeout_manager.add(entry)
+
+    def _forget_timeout(self, entry):
+        key = (entry.node, entry.role)
+        entries = self.timeouts[key]
+        entries.remove(entry)
+        if not entries:
+            del self.timeouts[key]
 
     def mark_acked(self, node, role):
+        if self.state.get(node) == MessagingSession.STATE_IN_PROGRESS:
+            self.undelivered -= 1
         self.state[node] = MessagingSession.STATE_DELIVERED
         self.remove_timeout_of_node(node, role)
 
-    def remove_timeout_of_node(self, node, role):
-        # optimization: skip if there's no entry for this `node` and `role`
-        if not any(map(lambda entry: entry.node == node and entry.role == role, self.timeouts)):
-            return
-        self.timeouts = [entry for entry in self.timeouts if entry.node != node or entry.role != role]
+    def is_done(self):
+        """A session is done once all members acked and nothing can set new timeouts. It would
+        only ignore further ACKs from now on."""
+        return self.undelivered == 0 and self.unsent == 0 and not self.timeouts
 
-    def update_timeout(self, node, role, new_t_offset):
-        for entry in self.timeouts:
-            if entry.node == node and entry.role == role:
-                entry.deadline = self.sim.time + new_t_offset
+    def remove_all_timeouts(self):
+        for entries in self.timeouts.values():
+            for entry in entries:
+                entry.removed = True
+        self.timeouts = {}
+
+    def remove_timeout_of_node(self, node, role):
+        entries = self.timeouts.pop((node, role), None)
+        if entries:
+            for entry in entries:
+                entry.removed = True
 
     def next_receiver(self, failed_node):
         return self.schedule.get_next_receiver(failed_node)
@@ -149,11 +208,17 @@ class RollercoasterStrategy(SendingStrategy):
                  k, p=1,
                  timeout_multiplier=1.5,
                  timeouts_active=True,
-                 drop_offline=False):
+                 drop_offline=False,
+                 schedule_cache_size=1024,
+                 session_horizon_ms=None):
         """Creates a new RollercoasterStrategy for a given user.
 
         k: the parameter for `gen_schedule` determining how wide the messaging tree is
         timeout_multiplier: the multiplicative factor to scale the estimated timeouts
+        schedule_cache_size: schedules kept in the `ScheduleCache` of the group (set by the
+            first member)
+        session_horizon_ms: if set, sessions are retired this long after they were started
+            even if not all members acked (their pending timeouts are dropped)
         """
         super().__init__(sim, user, group, app)
         self.k = k
@@ -170,9 +235,21 @@ class RollercoasterStrategy(SendingStrategy):
 
         # Book keeping
         self.nonce_counter = 0
-        self.sessions = dict()
+        self.sessions = dict()  # nonce -> live MessagingSession (see `_retire_session`)
+        self.timeouts = TimeoutManager()  # of all sessions
         self.last_seen = LastSeen()
-        self.seen_messages = HasSeenSet()
+        self.seen_messages = WindowedSeenSet()  # `m.id()` as ((source, role), nonce)
+        self.schedule_cache_size = schedule_cache_size
+        self.session_horizon_ms = session_horizon_ms
+        self.sessions_by_age = collections.deque()  # only used with `session_horizon_ms`
+
+    @property
+    def schedules(self):
+        """The schedules are the same for all members and hence shared via the group"""
+        if self.group.schedule_cache is None:
+            self.group.schedule_cache = ScheduleCache(
+                self.group.users, self.sim.output, self.schedule_cache_size)
+        return self.group.schedule_cache
 
     def send_to_group(self, payload):
         #opt assert self.user.online
@@ -188,20 +265,26 @@ class RollercoasterStrategy(SendingStrategy):
                                      source=self.user, nonce=session.nonce, role=r, sender=self.user)
             m.callback = lambda m: self._on_send_callback(m)
             self.user.schedule_for_send(m)
+        session.unsent += len(rs)
+        self._retire_if_done(session)
 
     def _on_send_callback(self, m):
         #opt assert isinstance(m, RollercoasterMessage)
         if m.body == RollercoasterMessage.ACK:
             return
 
-        # No work to do if timeouts are not active
-        if not self.timeouts_active:
-            return
-
         # Only the source maintains timeouts. Therefore, we can ignore callbacks in all other cases
         if m.source != self.user:
             return
-        session = self._get_session(nonce=m.nonce)
+        session = self.sessions.get(m.nonce)
+        if session is None:
+            return  # expired (see `session_horizon_ms`)
+        session.unsent -= 1
+
+        # No work to do if timeouts are not active
+        if not self.timeouts_active:
+            self._retire_if_done(session)
+            return
 
         #opt assert m.role != self.user
 
@@ -242,8 +325,12 @@ class RollercoasterStrategy(SendingStrategy):
     def on_ack(self, m):
         #opt assert m.source == self.user
 
-        session = self._get_session(nonce=m.nonce)
+        session = self.sessions.get(m.nonce)
+        if session is None:
+            return  # already retired
+
         session.mark_acked(m.sender, m.role)
+        self._retire_if_done(session)
 
     def on_payload(self, m):
         # Do not help if we received the message while being offline
@@ -252,7 +339,7 @@ class RollercoasterStrategy(SendingStrategy):
             return
 
         # Ignore already seen messages (but do ack)
-        if self.seen_messages.check_and_insert(m.id()):
+        if self.seen_messages.check_and_insert((m.source, m.role), m.nonce):
             self.send_ack(m)
             return
 
@@ -260,7 +347,7 @@ class RollercoasterStrategy(SendingStrategy):
         self._deliver(m)
 
         # Send payload to children
-        schedule = Schedule(m.source, self.group.users, self.k, m.nonce)
+        schedule = self.schedules.get(m.source, self.k, m.nonce)
         children = schedule.get_direct_children(m.role)
 
         for r in children:
@@ -282,50 +369,97 @@ class RollercoasterStrategy(SendingStrategy):
             source=m.source, nonce=m.nonce, role=m.role, sender=self.user
         ))
 
+    def next_wakeup(self, sim):
+        expiry = None
+        if self.session_horizon_ms is not None:
+            self._prune_sessions_by_age()
+            if self.sessions_by_age:
+                expiry = self.sessions_by_age[0].created_at + self.session_horizon_ms
+
+        if not self.timeouts_active:
+            return expiry
+        deadline = self.timeouts.next_deadline()
+        if expiry is None or (deadline is not None and deadline < expiry):
+            return deadline
+        return expiry
+
     def tick(self, sim):
+        if self.session_horizon_ms is not None:
+            self._expire_sessions(sim)
+
         if not self.timeouts_active:
             return
 
-        # handle failed timeouts
-        for session in self.sessions.values():
-            failed_timeouts = session.get_failed_timeouts(remove=True)
+        # handle failed timeouts (nothing to do until the earliest deadline)
+        failed_entries = self.timeouts.pop_failed(sim.time)
+        for failed_entry in failed_entries:
+            session = failed_entry.session
+            failed_node, failed_role = failed_entry.node, failed_entry.role
 
-            for failed_entry in failed_timeouts:
-                failed_node, failed_role = failed_entry.node, failed_entry.role
+            # This node is unlikely to be a good candidate
+            self.last_seen.mark_failed(failed_node)
 
-                # This node is unlikely to be a good candidate
-                self.last_seen.mark_failed(failed_node)
+            # We ignore failed leaf nodes since we assume eventual delivery
+            if session.schedule.is_leaf(failed_role):
+                continue
 
-                # We ignore failed leaf nodes since we assume eventual delivery
-                if session.schedule.is_leaf(failed_role):
-                    continue
+            # get a better candidate (first using last-seen nodes, then following schedule)
+            new_recipient = None
+            new_recipient = self.last_seen.pop_candidate()
+            if not new_recipient:
+                new_recipient = session.schedule.get_next_receiver(failed_node)
 
-                # get a better candidate (first using last-seen nodes, then following schedule)
-                new_recipient = None
-                new_recipient = self.last_seen.pop_candidate()
-                if not new_recipient:
-                    new_recipient = session.schedule.get_next_receiver(failed_node)
+            # Send the message their way
+            self.user.schedule_for_send(
+                RollercoasterMessage(
+                    recipient=new_recipient, body=session.payload, group_id=self.group.id,
+                    source=self.user, nonce=session.nonce, role=failed_role, sender=self.user))
 
-                # Send the message their way
-                self.user.schedule_for_send(
-                    RollercoasterMessage(
-                        recipient=new_recipient, body=session.payload, group_id=self.group.id,
-                        source=self.user, nonce=session.nonce, role=failed_role, sender=self.user))
+            # remove all timeouts of all children (will be set again when the message is sent)
+            for c in session.schedule.get_recursive_children(failed_role):
+                session.remove_timeout_of_node(c, c)
 
-                # remove all timeouts of all children (will be set again when the message is sent)
-                for c in session.schedule.get_recursive_children(failed_role):
-                    session.remove_timeout_of_node(c, c)
+        for failed_entry in failed_entries:
+            self._retire_if_done(failed_entry.session)
 
     def clean(self):
         self.sessions = dict()
+        self.sessions_by_age = collections.deque()
+        self.timeouts = TimeoutManager()
         self.last_seen = LastSeen()
-        self.seen_messages = HasSeenSet()
+        self.seen_messages = WindowedSeenSet()
+        self.schedules.clear()
 
     def _add_session(self, payload):
-        session = MessagingSession(self, self.user, self.nonce_counter, payload)
+        schedule = self.schedules.get(self.user, self.k, self.nonce_counter)
+        session = MessagingSession(self, self.user, self.nonce_counter, payload, schedule, self.timeouts)
         self.sessions[self.nonce_counter] = session
         self.nonce_counter += 1
+        if self.session_horizon_ms is not None:
+            self.sessions_by_age.append(session)
+        self.sim.output.log_session_started()
         return session
 
     def _get_session(self, nonce):
         return self.sessions[nonce]
+
+    def _retire_if_done(self, session):
+        if not session.retired and session.is_done():
+            self._retire_session(session, MessagingSession.RETIRED_DELIVERED)
+
+    def _retire_session(self, session, reason):
+        """Forgets the session; only its summary is kept in the `SimulationOutput`"""
+        session.retired = True
+        session.remove_all_timeouts()
+        del self.sessions[session.nonce]
+        self.sim.output.log_session_retired(reason, session.undelivered)
+
+    def _prune_sessions_by_age(self):
+        while self.sessions_by_age and self.sessions_by_age[0].retired:
+            self.sessions_by_age.popleft()
+
+    def _expire_sessions(self, sim):
+        self._prune_sessions_by_age()
+        while self.sessions_by_age and self.sessions_by_age[0].created_at + self.session_horizon_ms <= sim.time:
+            self._retire_session(self.sessions_by_age.popleft(), MessagingSession.RETIRED_EXPIRED)
+            self._prune_sessions_by_age()
@@ -1,116 +1,148 @@
+from collections import OrderedDict
+from functools import lru_cache
 from math import log, ceil
 from simulation.utils import reorder_inplace_with_seed
 
 
-def _flatten_schedule(schedule):
-    return [x for r, xs in schedule for x in xs]
+class ScheduleTree:
+    """The schedule for a group of `n` members in terms of their positions: the source has
+    position 0 and the receivers are numbered in the order in which they are reached. As the
+    tree only depends on `n` and `k`, it is shared by all schedules with the same parameters
+    (see `schedule_tree`) and the members are only mapped at the boundary (see `Schedule`).
 
-
-class Graph:
-    """A simple graph abstraction that allows retrieving the internal node respresentation
-    via the references provided in the schedule.
+    The tree is stored in flat lists indexed by position: the direct children of `v` are
+    `children[child_offset[v]:child_offset[v+1]]` and its subtree (excluding `v`) is
+    `preorder[preorder_index[v]+1:subtree_end[v]]`.
     """
 
-    class Node:
-        def __init__(self, id, parent=None):
-            self.id = id
-            self.children = []
-            self.parent = parent
-            if self.parent:
-                self.parent.children.append(self)
-
-        def preorder_traversal(self):
-            """Returns the subtree excluding the root item"""
-            for x in self.children:
-                yield x
-                yield from x.preorder_traversal()
-
-        def __repr__(self):
-            return "N(%s)" % str(self.id)
-
-    def __init__(self, schedule):
-        flat_schedule = _flatten_schedule(schedule)
-        source = flat_schedule[0][0]
-
-        self.nodes = {source: Graph.Node(source)}
-        for sender, receiver in _flatten_schedule(schedule):
-            self.nodes[receiver] = Graph.Node(receiver, parent=self.nodes[sender])
-
-    def get_parents(self, node):
-        """Returns all parents of the given `node` up-to-and-including the source node"""
-        if node.parent:
-            yield node.parent
-            yield from self.get_parents(node.parent)
-
-    def get_hops_between(self, root, node):
-        """Returns the number of hops between `node` to `root` assuming that `node`
-        is in the subtree of `root`.
+    def __init__(self, n, k):
+        self.n, self.k = n, k
+
+        T = ceil(log(n, k+1)) if n > 1 else 0
+        self.rounds = []  # list of (t, [(sender, receiver)]) as in the paper
+        self.parent = [-1] * n
+        self.depth = [0] * n
+        children = [[] for _ in range(n)]
+        for t in range(T):
+            p = (k+1)**t  # knowing users
+            w = min(k*p, n - p)  # number of messages this round
+            R = []
+            for idx in range(w):
+                a, b = idx // k, p + idx
+                R.append((a, b))
+                self.parent[b] = a
+                self.depth[b] = self.depth[a] + 1
+                children[a].append(b)
+            self.rounds.append((t, R))
+
+        self.child_offset = [0] * (n + 1)
+        self.children = []
+        for v in range(n):
+            self.children += children[v]
+            self.child_offset[v + 1] = len(self.children)
+
+        # senders always have a smaller position than their receivers
+        subtree_size = [1] * n
+        for v in range(n - 1, 0, -1):
+            subtree_size[self.parent[v]] += subtree_size[v]
+
+        self.preorder = []
+        stack = [0] if n else []
+        while stack:
+            v = stack.pop()
+            self.preorder.append(v)
+            stack.extend(reversed(children[v]))
+        self.preorder_index = [0] * n
+        for idx, v in enumerate(self.preorder):
+            self.preorder_index[v] = idx
+        self.subtree_end = [self.preorder_index[v] + subtree_size[v] for v in range(n)]
+
+        # Queueing delays (in units of `t_queue`) on the path from the source to `v`: each
+        # node queues its messages to the children plus the ACK (see `estimated_rtt`)
+        self.path_queue = [0] * n
+        for v in range(n):
+            queue = 1 + self.child_offset[v + 1] - self.child_offset[v]
+            self.path_queue[v] = queue + (self.path_queue[self.parent[v]] if v else 0)
+
+    def direct_children(self, v):
+        return self.children[self.child_offset[v]:self.child_offset[v + 1]]
+
+    def recursive_children(self, v):
+        """Returns the subtree excluding `v` in preorder"""
+        return self.preorder[self.preorder_index[v] + 1:self.subtree_end[v]]
+
+    def is_leaf(self, v):
+        return self.child_offset[v] == self.child_offset[v + 1]
+
+    def estimated_rtt(self, root, v, t_message, t_queue):
+        """See `Schedule.get_estimated_rtt`: the message delays of the path from `root` to `v`
+        and back, plus the queueing delays of all nodes on that path.
         """
-        count = 0
-        while node != root:
-            count += 1
-            node = node.parent
-            #opt assert node != None
-        return count
+        hops = self.depth[v] - self.depth[root]
+        root_queue = 1 + self.child_offset[root + 1] - self.child_offset[root]
+        queue = self.path_queue[v] - self.path_queue[root] + root_queue
+        return t_message * (2 + hops) + t_queue * queue
+
 
-    def __getitem__(self, node_id):
-        return self.nodes[node_id]
+@lru_cache(maxsize=64)
+def schedule_tree(n, k):
+    """Returns the shared `ScheduleTree` for `n` members and parameter `k`"""
+    return ScheduleTree(n, k)
 
 
 class Schedule:
     """Creates the schedule from the defining elements (i.e. the list of all users,
-    the source node, the nonce, parameter k). Then two representations are offered: `S`
-    which is the list-based scheduled as presented in the paper, and `G` which is a graph
-    based representation.
+    the source node, the nonce, parameter k). The structure is the shared `ScheduleTree`
+    and `order` maps its positions to the users (the nonce only changes this order). `S` is
+    the list-based schedule as presented in the paper.
     """
 
     def __init__(self, source, all_users, k, nonce=0):
         users_sorted = [source] + [x for x in all_users if x != source]
-        self.S = self._gen_schedule(users_sorted, k, nonce)
-        self.G = Graph(self.S)
+        self.order = users_sorted if nonce == 0 else self._order_randomised(users_sorted, nonce)
+        self.position = {u: idx for idx, u in enumerate(self.order)}
+        self.tree = schedule_tree(len(self.order), k)
+
+    @property
+    def S(self):
+        order = self.order
+        return [(t, [(order[a], order[b]) for a, b in R]) for t, R in self.tree.rounds]
 
     def _order_randomised(self, users, nonce):
         receivers = users[1:]
         reorder_inplace_with_seed(receivers, nonce)
         return [users[0]] + receivers
 
-    def _gen_schedule(self, users, k, nonce):
-        users = users if nonce == 0 else self._order_randomised(users, nonce)
-
-        T = ceil(log(len(users), k+1))
-        rounds = []
-        for t in range(T):
-            p = (k+1)**t  # knowing users
-            w = min(k*p, len(users) - p)  # number of messages this round
-            R = []
-            for idx in range(w):
-                a = users[int(idx / k)]
-                b = users[p + idx]
-                R.append((a, b))
-            rounds.append((t, R))
-
-        return rounds
-
     def get_next_receiver(self, failed_receiver):
-        recv_order = [self.S[0][1][0][0]]  # start with source as ultimate fallback
-        for _, R in self.S:
-            for _, receiver in R:
-                if receiver not in recv_order:
-                    recv_order.append(receiver)
-        pos = recv_order.index(failed_receiver)
-        return recv_order[(pos + 1) % len(recv_order)]
+        # the receivers are positioned in the order they are reached, after the source (which
+        # is the ultimate fallback)
+        pos = self.position[failed_receiver]
+        return self.order[(pos + 1) % len(self.order)]
 
     def get_direct_children(self, node_id):
-        return [x.id for x in self.G[node_id].children]
+        order = self.order
+        return [order[v] for v in self.tree.direct_children(self.position[node_id])]
 
     def get_recursive_children(self, node_id):
-        return [x.id for x in self.G[node_id].preorder_traversal()]
+        order = self.order
+        return [order[v] for v in self.tree.recursive_children(self.position[node_id])]
 
     def get_parents(self, node_id):
-        return [x.id for x in self.G.get_parents(self.G[node_id])]
+        """Returns all parents of the given node up-to-and-including the source node"""
+        parent, order = self.tree.parent, self.order
+        result = []
+        v = parent[self.position[node_id]]
+        while v >= 0:
+            result.append(order[v])
+            v = parent[v]
+        return result
 
     def get_hops_between(self, node_id_root, node_id_child):
-        return self.G.get_hops_between(self.G[node_id_root], self.G[node_id_child])
+        """Returns the number of hops between `node_id_child` to `node_id_root` assuming that
+        the child is in the subtree of the root.
+        """
+        depth = self.tree.depth
+        return depth[self.position[node_id_child]] - depth[self.position[node_id_root]]
 
     def get_estimated_rtt(self, node_id_root, node_id_final, t_message, t_queue):
         """Estimates the time from sending the message to the root, to the arrival of the
@@ -123,21 +155,47 @@ class Schedule:
             * message delay to next node [B.2]
         * at node_final queueing delay for the ACK message [C]
         * message delay for the response [D]
+
+        Each node on the path queues the messages to all its children, plus 1 for the ACK.
+        The coefficients of `t_message` and `t_queue` are precomputed by the `ScheduleTree`.
         """
-        node_final, node_root = self.G[node_id_final], self.G[node_id_root]
+        position = self.position
+        return self.tree.estimated_rtt(position[node_id_root], position[node_id_final], t_message, t_queue)
 
-        total = t_message  # [A]
+    def is_leaf(self, node_id):
+        return self.tree.is_leaf(self.position[node_id])
 
-        # [C,D] (first iteration) + [B.1,B.2] (optional, following iterations)
-        while True:
-            # The extra +1 is for the queueing of the ACK message
-            total += t_message + t_queue * (1 + len(node_final.children))
-            if node_final == node_root:
-                break
-            else:
-                node_final = node_final.parent
 
-        return total
+class ScheduleCache:
+    """Shares the schedules of one group between the strategies of all its members (the
+    source and every recipient of a payload need the same schedule). Schedules are keyed by
+    `(source, nonce, k)` and the least recently used ones are evicted once more than
+    `capacity` are stored. Hits and misses are counted in the `SimulationOutput`.
+    """
 
-    def is_leaf(self, node_id):
-        return len(self.G[node_id].children) == 0
+    def __init__(self, users, output, capacity=1024):
+        self.users = users
+        self.output = output
+        self.capacity = capacity
+        self._schedules = OrderedDict()  # (source, nonce, k) -> Schedule
+
+    def get(self, source, k, nonce):
+        key = (source, nonce, k)
+        schedule = self._schedules.get(key)
+        if schedule is not None:
+            self._schedules.move_to_end(key)
+            self.output.log_schedule_cache(hit=True)
+            return schedule
+
+        self.output.log_schedule_cache(hit=False)
+        schedule = Schedule(source, self.users, k, nonce)
+        self._schedules[key] = schedule
+        if len(self._schedules) > self.capacity:
+            self._schedules.popitem(last=False)
+        return schedule
+
+    def clear(self):
+        self._schedules.clear()
+
+    def __len__(self):
+        return len(self._schedules)
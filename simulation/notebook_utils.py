@@ -46,12 +46,15 @@ def create_strategy_factory(name):
 
 
 class NotebookSimulationConfig(object):
+    """Bundles the keyword arguments for the `LoopixConfiguration` (rates), the app, and the
+    `LoopixSimulation` itself (e.g. `{'engine': ENGINE_EVENT}`)."""
 
-    def __init__(self, loopix_kwargs=None, app_kwargs=None):
+    def __init__(self, loopix_kwargs=None, app_kwargs=None, sim_kwargs=None):
         self.loopix_kwargs = loopix_kwargs if loopix_kwargs else dict()
         self.app_kwargs = app_kwargs if app_kwargs else dict()
+        self.sim_kwargs = sim_kwargs if sim_kwargs else dict()
 
-    def derive_new(self, delta_loopix_kwargs=None, delta_app_kwargs=None):
+    def derive_new(self, delta_loopix_kwargs=None, delta_app_kwargs=None, delta_sim_kwargs=None):
         return NotebookSimulationConfig(
             loopix_kwargs=dict(
                 self.loopix_kwargs,
@@ -59,6 +62,9 @@ class NotebookSimulationConfig(object):
             app_kwargs=dict(
                 self.app_kwargs,
                 **(delta_app_kwargs if delta_app_kwargs else dict())),
+            sim_kwargs=dict(
+                self.sim_kwargs,
+                **(delta_sim_kwargs if delta_sim_kwargs else dict())),
         )
 
     def get_loopix_config(self):
@@ -73,7 +79,7 @@ def create_app(sim, group, strategy_name, app_kwargs, app_name="app"):
     )
 
 
-def create_simulation(m, config, online_schedules):
+def create_simulation(m, config, online_schedules, sim_kwargs=None, seed=0):
     # setup network
     network = LayeredMixNetwork(num_layers=3, mix_per_layer=3, config=config)
 
@@ -95,14 +101,19 @@ def create_simulation(m, config, online_schedules):
         network, providers, users,
         output=SimulationOutput(log_level=15),
         delta_ms=10,
-        config=config)
+        config=config,
+        seed=seed,
+        **(sim_kwargs if sim_kwargs else dict()))
 
 
-def create_scenario(m, group_sizes, notebook_sim_config, strategy_name, time_ms, online_schedules=[]):
-    sim = create_simulation(m, notebook_sim_config.get_loopix_config(), online_schedules)
+def create_scenario(m, group_sizes, notebook_sim_config, strategy_name, time_ms, online_schedules=[], seed=0):
+    """Creates a simulation with one app per group size. The `seed` is the master seed of the run
+    (use different seeds for replications of the same scenario)."""
+    sim = create_simulation(
+        m, notebook_sim_config.get_loopix_config(), online_schedules, notebook_sim_config.sim_kwargs, seed)
     sim.simulation_run_time_ms = time_ms  # indicator for the parallelrunner.py
 
-    r = SimRandom(sim=None, seed=0)
+    r = SimRandom(sim=None, seed=seed)
     for gid, gs in enumerate(group_sizes):
         users = r.sample(sim.users, gs)
         app = create_app(sim, Group("group_%d" % gid, users), strategy_name, notebook_sim_config.app_kwargs)
@@ -118,17 +129,21 @@ def get_name_for_sim(sim, config_name, offline_schedule_name, strategy_name):
         config_name=config_name,
         offline_schedule_name=offline_schedule_name,
         strategy_name=strategy_name,
+        seed=sim.seed,
     )
 
 
-def get_name(m, group_sizes, config_name,  offline_schedule_name, strategy_name):
+def get_name(m, group_sizes, config_name,  offline_schedule_name, strategy_name, seed=0):
+    """The seed is only part of the name for replications (i.e. `seed != 0`)"""
     gs_text = "-".join([str(gs) for gs in group_sizes])
-    return ("SIM_M%03d_GS%s_%s_%s_%s.input" % (
+    seed_text = "_seed%d" % seed if seed else ""
+    return ("SIM_M%03d_GS%s_%s_%s_%s%s.input" % (
         m,
         gs_text,
         config_name,
         offline_schedule_name,
-        strategy_name
+        strategy_name,
+        seed_text,
     )).lower()
 
 
@@ -1,20 +1,63 @@
+import bisect
+import hashlib
+import itertools
 import math
 import random as python_random
 
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover (e.g. the PyPy image does not ship numpy)
+    np = None
+
+BACKEND_PYTHON, BACKEND_NUMPY = "python", "numpy"
+VALID_BACKENDS = (BACKEND_PYTHON, BACKEND_NUMPY)
+
 
 class SimRandom():
     """The only random source to be used by the simulation. It's wrapping around an internal
-    Random() object with defined seed ensures that runs can are reproducible."""
+    Random() object with defined seed ensures that runs can are reproducible.
+
+    Every actor of the simulation draws from its own `substream()` that is derived from the
+    master seed and the actor's key. Hence, the results do not depend on the order in which the
+    actors are ticked and different master seeds give independent replications.
+
+    With `backend=BACKEND_NUMPY` the numbers are served from blocks pre-drawn by NumPy instead
+    (see `NumpyRandomSource`). The interface and distributions are the same for both backends,
+    but the concrete streams differ.
+    """
 
-    def __init__(self, sim, seed=0):
+    def __init__(self, sim, seed=0, backend=BACKEND_PYTHON):
+        #opt assert backend in VALID_BACKENDS
         self._sim = sim
-        self._random = python_random.Random()
-        self._random.seed(0)
+        self.seed = seed
+        self.backend = backend
+        if backend == BACKEND_NUMPY:
+            self._random = NumpyRandomSource(seed)
+        else:
+            self._random = python_random.Random()
+            self._random.seed(seed)
         self._cached_f = {}
 
+    def substream(self, key):
+        """Returns an independent `SimRandom` for the given key (e.g. the name of an actor). The
+        seed is derived with a stable hash so that it is the same in every process."""
+        digest = hashlib.sha256(("%d/%s" % (self.seed, key)).encode()).digest()
+        return SimRandom(self._sim, seed=int.from_bytes(digest[:8], 'little'), backend=self.backend)
+
     def choice(self, l):
         return self._random.choice(l)
 
+    def choice_each(self, seqs):
+        """Returns a random element of each of the sequences (same draws as calling `choice`
+        for each of them in order)"""
+        if self.backend == BACKEND_NUMPY:
+            return self._random.choice_each(seqs)
+        choice = self._random.choice
+        return [choice(seq) for seq in seqs]
+
+    def random(self):
+        return self._random.random()
+
     def choice_with_weights(self, l, weights):
         #opt assert len(l) == len(weights)
 
@@ -26,6 +69,11 @@ class SimRandom():
 
         #opt assert False, "unreachable" # pragma: no cover
 
+    def categorical(self, cumulative_weights):
+        """Returns the index drawn with the probabilities given by the cumulative weights"""
+        idx = bisect.bisect_right(cumulative_weights, self._random.random() * cumulative_weights[-1])
+        return min(idx, len(cumulative_weights) - 1)  # in case the product is rounded up
+
     def sample(self, population, k):
         return self._random.sample(population, k)
 
@@ -48,3 +96,226 @@ class SimRandom():
 
     def poisson_delay(self, rate_in_seconds):
         return int(1000 * self._random.expovariate(rate_in_seconds))
+
+    def poisson_delays(self, rate_in_seconds, n):
+        """Same as calling `poisson_delay` `n` times"""
+        if self.backend == BACKEND_NUMPY:
+            return [int(1000 * x) for x in self._random.expovariates(rate_in_seconds, n)]
+        expovariate = self._random.expovariate
+        return [int(1000 * expovariate(rate_in_seconds)) for _ in range(n)]
+
+    def poisson_process(self, rate_in_seconds):
+        return PoissonProcess(self, rate_in_seconds)
+
+    def superposed_poisson_process(self, rates_in_seconds):
+        return SuperposedPoissonProcess(self, rates_in_seconds)
+
+    def poisson_rounds_until_event(self, rate_in_seconds):
+        """Returns the number of rounds without an event before `poisson_event` would fire. It
+        follows the geometric distribution with `p = 1 - exp(-rate * delta)` which is the same as
+        flooring an exponentially distributed time to whole rounds."""
+        if rate_in_seconds <= 0:
+            return math.inf
+        return int(self._random.expovariate(rate_in_seconds) / self._sim.delta_seconds)
+
+    def poisson_time_until_event(self, rate_in_seconds):
+        """Returns the (continuous) time in ms until the next event of a Poisson process"""
+        if rate_in_seconds <= 0:
+            return math.inf
+        return 1000 * self._random.expovariate(rate_in_seconds)
+
+
+class PoissonProcess():
+    """Samples the round of the next event of a Poisson process ahead of time. Compared to
+    drawing `poisson_event` every round, a random number is only drawn when the process fires
+    and all other rounds only cost a comparison. The event engine uses `next_time` directly.
+
+    The process only advances on rounds it is polled with `fires()`. If it has not been polled
+    on its due round (e.g. the owner was offline) a fresh sample is drawn which is exact as the
+    process is memoryless.
+    """
+
+    def __init__(self, rnd, rate_in_seconds):
+        self._rnd = rnd
+        self.rate_in_seconds = rate_in_seconds
+        self.next_time = -1  # forces a fresh sample on first use
+
+    def set_rate(self, rate_in_seconds):
+        self.rate_in_seconds = rate_in_seconds
+        self.next_time = -1
+
+    def fires(self, sim):
+        now = sim.time
+        if now < self.next_time:
+            return False
+
+        if now > self.next_time:
+            # first use or we missed our round
+            self.next_time = self._sample_from(now, sim)
+            if now != self.next_time:
+                return False
+
+        self.next_time = self._sample_from(now + sim.delta_ms, sim)
+        return True
+
+    def skip_until(self, t, sim):
+        """Advances the process to its first event at or after round `t` (as if it had been
+        polled on all rounds before) and returns the number of skipped events."""
+        if sim.time > self.next_time:
+            self.next_time = self._sample_from(sim.time, sim)
+
+        skipped = 0
+        while self.next_time < t:
+            skipped += 1
+            self.next_time = self._sample_from(self.next_time + sim.delta_ms, sim)
+        return skipped
+
+    def _sample_from(self, t, sim):
+        return t + sim.delta_ms * self._rnd.poisson_rounds_until_event(self.rate_in_seconds)
+
+
+class SuperposedPoissonProcess():
+    """Merges independent Poisson processes (e.g. the duties of a user) into one process with the
+    summed rate. For each event of the merged process a categorical draw weighted by the rates
+    picks the process it belongs to. Hence, only one next event has to be tracked per actor.
+
+    The events are sampled in continuous time and `fires()` returns the flags of the processes
+    with at least one event during the current round. Therefore each flag is still an independent
+    Bernoulli trial with `p = 1 - exp(-rate * delta)` per round, i.e. exactly the statistics of
+    polling one `PoissonProcess` per rate. Like `PoissonProcess`, a missed round draws a fresh
+    sample.
+    """
+
+    def __init__(self, rnd, rates_in_seconds):
+        self._rnd = rnd
+        self.rates_in_seconds = rates_in_seconds
+        self._active = [idx for idx, rate in enumerate(rates_in_seconds) if rate > 0]
+        self._cumulative_rates = list(itertools.accumulate(rates_in_seconds[idx] for idx in self._active))
+        self._total_rate = self._cumulative_rates[-1] if self._active else 0
+        self._event_time = None  # continuous time in ms of the next event
+        self.next_time = -1  # round of the next event (forces a fresh sample on first use)
+
+    def fires(self, sim):
+        """Returns `None` if no process fires in this round and the list of flags otherwise"""
+        now = sim.time
+        if now < self.next_time:
+            return None
+
+        if now > self.next_time:
+            # first use or we missed our round
+            self._sample_from(now, sim)
+            if now != self.next_time:
+                return None
+
+        end, fired = now + sim.delta_ms, [False] * len(self.rates_in_seconds)
+        while self._event_time < end:
+            fired[self._pick()] = True
+            self._sample_from(self._event_time, sim)
+        return fired
+
+    def _pick(self):
+        if len(self._active) == 1:
+            return self._active[0]
+        return self._active[self._rnd.categorical(self._cumulative_rates)]
+
+    def _sample_from(self, t, sim):
+        self._event_time = t + self._rnd.poisson_time_until_event(self._total_rate)
+        if self._event_time == math.inf:
+            self.next_time = math.inf
+        else:
+            self.next_time = int(self._event_time // sim.delta_ms) * sim.delta_ms
+
+
+class NumpyRandomSource():
+    """A drop-in replacement for the subset of `random.Random` used by `SimRandom` that serves
+    all numbers from large blocks pre-drawn from NumPy `Generator`s (PCG64). This avoids the
+    per-draw interpreter overhead of `random.Random` on CPython.
+
+    Deterministic-stream guarantee: uniforms and exponentials are taken from two independent
+    PCG64 streams derived from `SeedSequence(seed)`. For a given seed, the n-th uniform (and the
+    n-th exponential) is always the same number regardless of the `block_size` and of how the
+    calls to the different methods are interleaved. All other methods are derived from the
+    uniform stream: `choice` and `shuffle` use one uniform per index and `sample` uses one uniform
+    per picked element. Pickling keeps the generator states, but numbers left in the current
+    blocks are discarded (i.e. the streams continue at the next block boundary).
+
+    As every actor has its own substream, the blocks start small (`initial_block_size`) and
+    double with every block up to `block_size`. Hence, rarely used streams stay small.
+    """
+
+    def __init__(self, seed, block_size=1 << 16, initial_block_size=256):
+        if np is None:
+            raise ImportError("The numpy random backend requires numpy to be installed")
+
+        uniform_seed, exponential_seed = np.random.SeedSequence(seed).spawn(2)
+        self._block_size = block_size
+        self._initial_block_size = min(initial_block_size, block_size)
+        self._uniform_generator = np.random.Generator(np.random.PCG64(uniform_seed))
+        self._exponential_generator = np.random.Generator(np.random.PCG64(exponential_seed))
+        self._init_streams()
+
+    def _init_streams(self):
+        # perf tweak: the `__next__` of a chain over Python lists is as cheap as the C-level
+        # `random.Random.random` and only calls back into Python once per block
+        self._uniforms = itertools.chain.from_iterable(self._blocks(self._uniform_generator.random))
+        self._exponentials = itertools.chain.from_iterable(
+            self._blocks(self._exponential_generator.standard_exponential))
+        self.random = self._uniforms.__next__
+        self.standard_exponential = self._exponentials.__next__
+
+    def _blocks(self, draw):
+        size = self._initial_block_size
+        while True:
+            yield draw(size).tolist()
+            size = min(2 * size, self._block_size)
+
+    def __getstate__(self):
+        return {
+            'block_size': self._block_size,
+            'initial_block_size': self._initial_block_size,
+            'uniform_state': self._uniform_generator.bit_generator.state,
+            'exponential_state': self._exponential_generator.bit_generator.state,
+        }
+
+    def __setstate__(self, d):
+        self._block_size = d['block_size']
+        self._initial_block_size = d.get('initial_block_size', self._block_size)
+        self._uniform_generator = np.random.Generator(np.random.PCG64())
+        self._uniform_generator.bit_generator.state = d['uniform_state']
+        self._exponential_generator = np.random.Generator(np.random.PCG64())
+        self._exponential_generator.bit_generator.state = d['exponential_state']
+        self._init_streams()
+
+    def expovariate(self, lambd):
+        return self.standard_exponential() / lambd
+
+    def expovariates(self, lambd, n):
+        return [x / lambd for x in itertools.islice(self._exponentials, n)]
+
+    def _below(self, n):
+        # `random() < 1` and hence the result is always `< n` (as for Python's old `choice`)
+        return int(self.random() * n)
+
+    def choice(self, seq):
+        return seq[int(self.random() * len(seq))]
+
+    def choice_each(self, seqs):
+        return [seq[int(u * len(seq))] for seq, u in zip(seqs, itertools.islice(self._uniforms, len(seqs)))]
+
+    def shuffle(self, x):
+        # Fisher-Yates like `random.Random.shuffle`
+        for i in reversed(range(1, len(x))):
+            j = self._below(i + 1)
+            x[i], x[j] = x[j], x[i]
+
+    def sample(self, population, k):
+        pool = list(population)
+        n = len(pool)
+        if not 0 <= k <= n:
+            raise ValueError("Sample larger than population or is negative")
+
+        # partial Fisher-Yates from the front
+        for i in range(k):
+            j = i + self._below(n - i)
+            pool[i], pool[j] = pool[j], pool[i]
+        return pool[:k]
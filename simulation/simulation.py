@@ -1,7 +1,13 @@
 from simulation.messages import VALID_TAGS, Message
-from simulation.simrandom import SimRandom
+from simulation.simrandom import SimRandom, BACKEND_PYTHON
+from simulation.utils import CalendarQueue
 
 from collections.abc import Iterable
+import heapq
+import math
+
+ENGINE_TICK, ENGINE_EVENT = "tick", "event"
+VALID_ENGINES = (ENGINE_TICK, ENGINE_EVENT)
 
 
 class SimulationObject():
@@ -12,9 +18,28 @@ class SimulationObject():
     def deliver(self, sim, m):  # pragma: no cover
         raise NotImplementedError("deliver() must be implemented when receiving messages")
 
+    def deliver_many(self, sim, messages):
+        """Delivers all messages sent to this object in the last round (in the order they were
+        sent). The list is reused by the simulation, so it must not be kept.
+        """
+        for m in messages:
+            self.deliver(sim, m)
+
     def tick(self, sim):  # pragma: no cover
         raise NotImplementedError("tick() must be implemented")
 
+    def stream_key(self):
+        """The key for deriving this object's random substream (see `SimRandom.substream`)"""
+        return self.name
+
+    def next_wakeup(self, sim):
+        """Used by the event engine: returns the earliest round `>= sim.time` at which `tick()`
+        has to be called again (assuming it has been called for all due rounds before), or
+        `None` if only a delivered message can create new work. The default is to be ticked
+        every round.
+        """
+        return sim.time
+
     def __repr__(self):
         return self.name.upper()
 
@@ -36,6 +61,25 @@ class SimulationOutput():
 
         self.already_seen = {}  # app -> count
 
+        self.elided_cover = {}  # tag -> count (only used with `elide_cover=True`)
+
+        # only used with `fast_forward=True`
+        self.skipped_mix_loops = 0  # mix loops not sent during skipped rounds
+        self.dropped_cover = {}  # tag -> count of in-flight cover messages dropped by a skip
+
+        # Rollercoaster schedules taken from (or added to) the `ScheduleCache` of their group
+        self.schedule_cache_hits = 0
+        self.schedule_cache_misses = 0
+
+        # sessions of the Rollercoaster sources (see `RollercoasterStrategy._retire_session`)
+        self.live_sessions = 0
+        self.peak_live_sessions = 0
+        self.retired_sessions = {}  # reason -> count
+        self.undelivered_at_retirement = 0  # members that never acked a retired session
+
+        # only used with `sample_interval_ms`
+        self.payload_buffer_levels = {}  # time -> (queued payloads of each user)
+
     def log(self, sim, who, what, level):
         if level >= self.log_level:
             t = "%06d %10s: %s" % (sim.time, who, what)
@@ -64,18 +108,65 @@ class SimulationOutput():
 
         self.already_seen[app] += 1
 
+    def log_elided_cover(self, tag, count=1):
+        """Called instead of sending cover traffic (drop and loop messages) when the simulation
+        elides it.
+        """
+        self.elided_cover[tag] = self.elided_cover.get(tag, 0) + count
+
+    def log_fast_forward(self, skipped_mix_loops, dropped_messages):
+        """Called when the simulation skips idle rounds: counts the mix loops that were not
+        sent and the in-flight cover messages that were dropped.
+        """
+        self.skipped_mix_loops += skipped_mix_loops
+        for m in dropped_messages:
+            self.dropped_cover[m.tag] = self.dropped_cover.get(m.tag, 0) + 1
+
+    def log_schedule_cache(self, hit):
+        """Called whenever a strategy looks up a schedule in the cache of its group"""
+        if hit:
+            self.schedule_cache_hits += 1
+        else:
+            self.schedule_cache_misses += 1
+
+    def log_session_started(self):
+        self.live_sessions += 1
+        self.peak_live_sessions = max(self.peak_live_sessions, self.live_sessions)
+
+    def log_session_retired(self, reason, undelivered):
+        """Called when a session is forgotten, either because all members acked or because it
+        expired (then `undelivered` members did not ack).
+        """
+        self.live_sessions -= 1
+        self.retired_sessions[reason] = self.retired_sessions.get(reason, 0) + 1
+        self.undelivered_at_retirement += undelivered
+
+    def log_payload_buffer_levels(self, t, levels):
+        """Called every `sample_interval_ms` with the number of payloads each user has queued
+        for sending at time `t` (in the order of `sim.users`).
+        """
+        self.payload_buffer_levels[t] = tuple(levels)
+
 
 class Simulation(RecursiveSimulationObject):
 
-    def __init__(self, name, objects, output, delta_ms=1, seed=0):
+    def __init__(self, name, objects, output, delta_ms=1, seed=0, engine=ENGINE_TICK,
+                 random_backend=BACKEND_PYTHON, sample_interval_ms=None):
         super().__init__(name, objects)
+        #opt assert engine in VALID_ENGINES
         self.time = 0  # Total time passed in ms
-        self.messages_in_transit = []
+        # Messages sent this round, bucketed by recipient. The lists are kept (and reused) for
+        # all recipients ever seen, `transit_recipients` holds those with pending messages.
+        self.messages_in_transit = {}
+        self.transit_recipients = []
+        self.delay_queue = CalendarQueue()  # delayed messages of all nodes (see `CalendarQueue`)
         self.output = output
         self.users = []
 
-        # Global random generator for this simulation
-        self.rnd = SimRandom(self, seed=seed)
+        # Master random generator for this simulation; the actors use their own substreams
+        self.seed = seed
+        self.rnd = SimRandom(self, seed=seed, backend=random_backend)
+        self.assign_random_streams(self.objects)
 
         # Delta time steps in ms
         self.delta_ms = delta_ms
@@ -83,6 +174,25 @@ class Simulation(RecursiveSimulationObject):
         # Perf tweak: precompute float for simrandom
         self.delta_seconds = delta_ms / 1000.0
 
+        # The tick engine calls `tick()` on all objects every round while the event
+        # engine only calls objects on the rounds returned by their `next_wakeup()`
+        self.engine = engine
+        self.event_driven = engine == ENGINE_EVENT
+
+        # If set, `sample()` is called for every multiple of this interval
+        self.sample_interval_ms = sample_interval_ms
+
+    def assign_random_streams(self, objects):
+        """Gives each (nested) object its own random substream `rnd`"""
+        for o in objects:
+            o.rnd = self.rnd.substream(o.stream_key())
+            if isinstance(o, RecursiveSimulationObject):
+                self.assign_random_streams(o.objects)
+
+    def round_up_to_tick(self, t):
+        """Returns the first round at or after the time `t` (which might be a float)"""
+        return int(math.ceil(t / self.delta_ms)) * self.delta_ms
+
     def log(self, who, what, level=1):
         self.output.log(self, who, what, level)
 
@@ -90,16 +200,28 @@ class Simulation(RecursiveSimulationObject):
         # Commented-out as optimization
         # self.log(self, "Sending message '%s' -> '%s'" % (sender, m.recipient), level=1)
 
-        self.messages_in_transit.append(m)
+        bucket = self.messages_in_transit.get(m.recipient)
+        if bucket is None:
+            bucket = self.messages_in_transit[m.recipient] = []
+        if not bucket:
+            self.transit_recipients.append(m.recipient)
+        bucket.append(m)
 
     def clean(self):
         for o in filter(lambda v: hasattr(v, 'clean'), self.objects):
             o.clean()
 
     def after_round(self):
-        for m in self.messages_in_transit:
-            m.recipient.deliver(self, m)
-        self.messages_in_transit = []
+        """Delivers the messages sent this round with one `deliver_many()` call per recipient,
+        in the order in which the recipients first received a message.
+        """
+        recipients, self.transit_recipients = self.transit_recipients, []
+        buckets = self.messages_in_transit
+        for o in recipients:
+            bucket = buckets[o]
+            o.deliver_many(self, bucket)
+            bucket.clear()
+        return recipients
 
     def tick(self, sim):
         """The simulation will evaluate for the current time and then
@@ -110,17 +232,131 @@ class Simulation(RecursiveSimulationObject):
     def _tick(self):
         for o in self.objects:
             o.tick(self)
+        self.delay_queue.release(self)
         self.time += self.delta_ms
         self.after_round()
 
     def run(self, time_ms):
-        iterations = time_ms // self.delta_ms
-        for _ in range(iterations):
+        if self.event_driven:
+            self._run_events(time_ms)
+        else:
+            self._run_ticks(time_ms)
+
+    def _run_ticks(self, time_ms):
+        rounds = time_ms // self.delta_ms
+        next_sample = self._first_sample_time()
+        while rounds > 0:
             self._tick()
+            rounds -= 1
 
             if self.time % 100_000 == 0:
-                self.log(
-                    who=self,
-                    what="progress %.2f%%" % (100 * self.time / time_ms),
-                    level=20
-                )
+                self._log_progress(time_ms)
+
+            if rounds > 0:
+                rounds -= self.skip_idle_rounds(rounds)
+
+            if self.time >= next_sample:
+                next_sample = self._sample_until(self.time, next_sample)
+
+    def skip_idle_rounds(self, max_rounds):
+        """Called by the tick engine after each round. Sub classes may advance `self.time` by
+        up to `max_rounds` rounds in which nothing relevant would happen. Returns the number
+        of skipped rounds.
+        """
+        return 0
+
+    def sample(self, t):
+        """Called every `sample_interval_ms` with the state as it is at time `t` (i.e. before
+        the round `t` is run). Sub classes log their time series here.
+        """
+        pass
+
+    def _first_sample_time(self):
+        if not self.sample_interval_ms:
+            return math.inf
+        return (self.time // self.sample_interval_ms + 1) * self.sample_interval_ms
+
+    def _sample_until(self, t, next_sample):
+        """Takes all samples up to time `t` and returns the time of the next sample. The
+        state must not have changed since the last sample time before `t`.
+        """
+        while next_sample <= t:
+            self.sample(next_sample)
+            next_sample += self.sample_interval_ms
+        return next_sample
+
+    def _run_events(self, time_ms):
+        """Runs the same rounds as `_run_ticks` but only calls `tick()` on the objects that
+        are due according to their `next_wakeup()` and the rounds in which the `delay_queue`
+        releases messages. Objects due in the same round are ticked in the same order as in the
+        tick engine and messages are delivered at the end of each round.
+        """
+        end = self.time + (time_ms // self.delta_ms) * self.delta_ms
+        objects = list(self._leaf_objects(self.objects))
+        index = {o: idx for idx, o in enumerate(objects)}
+
+        queue = []  # (round, object index); entries not matching `wakeups` are stale
+        wakeups = [self.time] * len(objects)
+        for idx in range(len(objects)):
+            queue.append((self.time, idx))
+
+        def reschedule(idx):
+            t = objects[idx].next_wakeup(self)
+            if t != wakeups[idx]:
+                wakeups[idx] = t
+                if t is not None and t < end:
+                    heapq.heappush(queue, (t, idx))
+
+        next_progress = (self.time // 100_000 + 1) * 100_000
+        next_sample = self._first_sample_time()
+        while True:
+            t = queue[0][0] if queue else None
+            release_round = self.delay_queue.next_round()
+            if release_round is not None and (t is None or release_round < t):
+                t = release_round
+
+            # nothing changes until round `t`, so the samples before it are taken now
+            next_sample = self._sample_until(end if t is None else min(t, end), next_sample)
+            if t is None or t >= end:
+                break
+
+            due = []
+            while queue and queue[0][0] == t:
+                _, idx = heapq.heappop(queue)
+                if wakeups[idx] == t:
+                    due.append(idx)
+                    wakeups[idx] = None
+
+            self.time = t
+            for idx in due:
+                objects[idx].tick(self)
+            self.delay_queue.release(self)
+            self.time += self.delta_ms
+
+            recipients = self.after_round()
+            for idx in due:
+                reschedule(idx)
+            for o in recipients:
+                idx = index.get(o)
+                if idx is not None:
+                    reschedule(idx)
+
+            while self.time >= next_progress:
+                self._log_progress(time_ms)
+                next_progress += 100_000
+
+        self.time = end
+
+    def _leaf_objects(self, objects):
+        for o in objects:
+            if isinstance(o, RecursiveSimulationObject):
+                yield from self._leaf_objects(o.objects)
+            else:
+                yield o
+
+    def _log_progress(self, time_ms):
+        self.log(
+            who=self,
+            what="progress %.2f%%" % (100 * self.time / time_ms),
+            level=20
+        )
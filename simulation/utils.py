@@ -1,7 +1,13 @@
-from simulation.messages import Message, WrappedMessage, WrappedMultiMessage
+from simulation.messages import Message, WrappedMessage
 
+import bisect
 import gzip
 import heapq
+import math
+import mmap
+import operator
+import os
+import struct
 
 
 def chunkify(ll, s):
@@ -24,15 +30,16 @@ def map_any_or_all(func, iterable_or_not):
 
 
 def traverse_message(m):
+    """Yields the message as seen by each hop (works for nested and flat `RoutedMessage`s)"""
     while isinstance(m, Message):
         yield m
-        if isinstance(m, WrappedMultiMessage):
-            for m_ in m.body:
-                yield from traverse_message(m_)
+        if not isinstance(m, WrappedMessage):
             return
-        elif isinstance(m, WrappedMessage):
-            m = m.unwrap()
-        else:
+
+        m = m.unwrap()
+        if isinstance(m, list):
+            for m_ in m:
+                yield from traverse_message(m_)
             return
 
 
@@ -42,6 +49,49 @@ def reorder_inplace_with_seed(list, seed):
     r.shuffle(list)
 
 
+class FenwickTree:
+    """Keeps the prefix sums of `n` non-negative weights (binary indexed tree) such that a weight
+    can be changed and an index drawn proportionally to its weight in O(log n).
+    """
+
+    def __init__(self, weights):
+        self.n = len(weights)
+        self.weights = list(weights)
+        self.tree = [0] * (self.n + 1)
+        for idx, w in enumerate(self.weights):
+            self._add(idx, w)
+
+    def _add(self, idx, delta):
+        idx += 1
+        while idx <= self.n:
+            self.tree[idx] += delta
+            idx += idx & -idx
+
+    def update(self, idx, weight):
+        if weight != self.weights[idx]:
+            self._add(idx, weight - self.weights[idx])
+            self.weights[idx] = weight
+
+    def total(self):
+        total, idx = 0, self.n
+        while idx > 0:
+            total += self.tree[idx]
+            idx -= idx & -idx
+        return total
+
+    def find(self, r):
+        """Returns the index `i` for which `sum(weights[:i]) <= r < sum(weights[:i+1])` where
+        `r` must be in `[0, total())`."""
+        pos, step = 0, 1 << self.n.bit_length()
+        while step:
+            nxt = pos + step
+            if nxt <= self.n and self.tree[nxt] <= r:
+                pos = nxt
+                r -= self.tree[nxt]
+            step >>= 1
+        return min(pos, self.n - 1)  # in case `r` was rounded up to the total
+
+
 class HasSeenSet:
 
     def __init__(self):
@@ -58,36 +108,176 @@ class HasSeenSet:
         self.set = set()
 
 
-class MessageDelayingBox:
-    class TimedEntry(object):
+class WindowedSeenSet:
+    """Answers the same as a `HasSeenSet` of `(stream, nonce)` elements, where the nonces of each
+    stream are mostly increasing integers (e.g. the payloads of an app per recipient). Instead
+    of one tuple per element, each stream keeps a watermark (all nonces below it were seen), a
+    bitmap of the `window` nonces above it, and the gaps (ranges of nonces that fell below the
+    watermark without being seen). Hence, the memory only grows with nonces that are missing.
+    """
 
-        def __init__(self, deadline, msg):
-            self.deadline = deadline
-            self.msg = msg
+    class Stream:
+        __slots__ = ('watermark', 'bits', 'gap_starts', 'gap_ends')
+
+        def __init__(self):
+            self.watermark = 0
+            self.bits = 0  # bit `i` is set if `watermark + i` was seen (bit 0 never is)
+            self.gap_starts, self.gap_ends = [], []  # sorted disjoint ranges [start, end)
+
+    def __init__(self, window=1024):
+        self.window = window
+        self.streams = {}
+        self.size = 0
+
+    def check_and_insert(self, stream, nonce):
+        """Returns whether `(stream, nonce)` was seen before and marks it as seen"""
+        s = self.streams.get(stream)
+        if s is None:
+            s = self.streams[stream] = WindowedSeenSet.Stream()
+
+        offset = nonce - s.watermark
+        if offset < 0:
+            return not self._remove_from_gaps(s, nonce)
+        if (s.bits >> offset) & 1:
+            return True
 
-        def __lt__(self, other):
-            return self.deadline < other.deadline
+        if offset >= self.window:
+            shift = offset - self.window + 1
+            self._add_gaps(s, shift)
+            s.bits >>= shift
+            s.watermark += shift
+            offset -= shift
+
+        bits = s.bits | (1 << offset)
+        if bits & 1:
+            # move the watermark over all seen nonces at its start
+            seen = (~bits & (bits + 1)).bit_length() - 1
+            bits >>= seen
+            s.watermark += seen
+        s.bits = bits
+        self.size += 1
+        return False
+
+    def _add_gaps(self, s, shift):
+        """Records the unseen nonces in `[watermark, watermark + shift)` as gaps"""
+        start = None
+        for i in range(min(shift, s.bits.bit_length())):
+            if (s.bits >> i) & 1:
+                if start is not None:
+                    self._append_gap(s, s.watermark + start, s.watermark + i)
+                    start = None
+            elif start is None:
+                start = i
+        if start is None:
+            start = s.bits.bit_length()
+        if start < shift:
+            self._append_gap(s, s.watermark + start, s.watermark + shift)
+
+    def _append_gap(self, s, start, end):
+        if s.gap_ends and s.gap_ends[-1] == start:
+            s.gap_ends[-1] = end
+        else:
+            s.gap_starts.append(start)
+            s.gap_ends.append(end)
 
-    def __init__(self):
-        self.pq = [] # [TimedEntry]
+    def _remove_from_gaps(self, s, nonce):
+        """Returns whether `nonce` was in a gap (i.e. not seen) and removes it from there"""
+        idx = bisect.bisect_right(s.gap_starts, nonce) - 1
+        if idx < 0 or nonce >= s.gap_ends[idx]:
+            return False
 
-    def add(self, sim, m):
-        #opt assert isinstance(m, WrappedMessage)
-        heapq.heappush(self.pq, MessageDelayingBox.TimedEntry(sim.time + m.delay, m))
+        start, end = s.gap_starts[idx], s.gap_ends[idx]
+        del s.gap_starts[idx], s.gap_ends[idx]
+        if nonce + 1 < end:
+            s.gap_starts.insert(idx, nonce + 1)
+            s.gap_ends.insert(idx, end)
+        if start < nonce:
+            s.gap_starts.insert(idx, start)
+            s.gap_ends.insert(idx, nonce)
+        self.size += 1
+        return True
+
+    def __contains__(self, element):
+        stream, nonce = element
+        s = self.streams.get(stream)
+        if s is None:
+            return False
+        offset = nonce - s.watermark
+        if offset >= 0:
+            return bool((s.bits >> offset) & 1)
+        idx = bisect.bisect_right(s.gap_starts, nonce) - 1
+        return idx < 0 or nonce >= s.gap_ends[idx]
 
-    def tick(self, sim):
-        pass # do nothing
+    def __len__(self):
+        return self.size
 
-    def pop_current_round(self, sim):
-        if len(self.pq) == 0 or self.pq[0].deadline > sim.time:
-            return []
+    def clear(self):
+        self.streams = {}
+        self.size = 0
 
-        this_round = []
-        while len(self.pq) > 0 and self.pq[0].deadline <= sim.time:
-            entry = heapq.heappop(self.pq)
-            this_round.append(entry.msg)
 
-        return this_round
+class CalendarQueue:
+    """Holds the delayed messages of all mix nodes and providers in one calendar keyed by the
+    round in which they are released (i.e. the first round at or after `sim.time + m.delay`).
+    `release()` only touches the due buckets and hands every message back to its node via
+    `node.release(sim, m)`. Within a bucket the messages are released in deadline order.
+    Hence, nodes do not need to poll their own (mostly empty) delaying boxes every round.
+    """
+
+    _deadline = operator.itemgetter(0)
+
+    def __init__(self):
+        self.buckets = {}  # round -> [(deadline, node, message)]
+        self.rounds = []  # heap of the rounds with a bucket
+
+    def __len__(self):
+        return sum(len(bucket) for bucket in self.buckets.values())
+
+    def add(self, sim, node, m):
+        deadline = sim.time + m.delay
+        release_round = int(math.ceil(deadline / sim.delta_ms)) * sim.delta_ms
+
+        bucket = self.buckets.get(release_round)
+        if bucket is None:
+            bucket = self.buckets[release_round] = []
+            heapq.heappush(self.rounds, release_round)
+        bucket.append((deadline, node, m))
+
+    def add_many(self, sim, node, messages):
+        """Same as calling `add()` for each message (in order)"""
+        time, delta_ms = sim.time, sim.delta_ms
+        buckets = self.buckets
+        for m in messages:
+            deadline = time + m.delay
+            release_round = int(math.ceil(deadline / delta_ms)) * delta_ms
+
+            bucket = buckets.get(release_round)
+            if bucket is None:
+                bucket = buckets[release_round] = []
+                heapq.heappush(self.rounds, release_round)
+            bucket.append((deadline, node, m))
+
+    def messages(self):
+        for bucket in self.buckets.values():
+            for _, _, m in bucket:
+                yield m
+
+    def clear(self):
+        self.buckets = {}
+        self.rounds = []
+
+    def next_round(self):
+        """Returns the earliest round with messages to release or `None` if empty"""
+        return self.rounds[0] if self.rounds else None
+
+    def release(self, sim):
+        rounds = self.rounds
+        while rounds and rounds[0] <= sim.time:
+            bucket = self.buckets.pop(heapq.heappop(rounds))
+            if len(bucket) > 1:
+                bucket.sort(key=CalendarQueue._deadline)
+            for _, node, m in bucket:
+                node.release(sim, m)
 
 
 def read_compressed_int_schedules(filename):
@@ -110,3 +300,127 @@ def read_compressed_bool_schedules(filename):
 def write_compressed_bool_schedules(bool_schedules, filename):
     int_schedules = ["".join(['1' if x else '0' for x in schedule]) for schedule in bool_schedules]
     write_compressed_int_schedules(int_schedules, filename)
+
+
+_PACKED_MAGIC = b"RCSCHED1"
+_PACKED_HEADER = struct.Struct("<8sII")  # magic, number of schedules, entries per schedule
+_PACKED_FILES = {}  # absolute filename -> (stat key, mmap, count, length); one mapping per process
+
+
+def _open_packed_schedules(filename):
+    """Returns the (cached) read-only memory map of a packed schedule file"""
+    path = os.path.abspath(filename)
+    st = os.stat(path)
+    key = (st.st_size, st.st_mtime_ns)
+
+    cached = _PACKED_FILES.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1:]
+
+    with open(path, 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, count, length = _PACKED_HEADER.unpack_from(data)
+    if magic != _PACKED_MAGIC:
+        raise ValueError("%s is not a packed schedule file" % filename)
+
+    _PACKED_FILES[path] = (key, data, count, length)
+    return data, count, length
+
+
+class PackedSchedule:
+    """A read-only view of one online/offline schedule in a packed schedule file (one bit per
+    second, see `write_packed_schedules`). It behaves like the list of bools returned by
+    `read_compressed_bool_schedules`, but the data stays in the memory-mapped file. Hence,
+    all processes reading the same file share the same physical pages. Pickling only stores
+    the filename and the index of the schedule.
+    """
+    __slots__ = ('filename', 'index', '_data', '_offset', '_length')
+
+    def __init__(self, filename, index):
+        self.filename = os.path.abspath(filename)  # pickles are loaded from other directories
+        self.index = index
+        self._map()
+
+    def _map(self):
+        data, count, length = _open_packed_schedules(self.filename)
+        if not 0 <= self.index < count:
+            raise IndexError("%s has only %d schedules" % (self.filename, count))
+        self._data = data
+        self._length = length
+        self._offset = _PACKED_HEADER.size + self.index * ((length + 7) // 8)
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, s):
+        if not 0 <= s < self._length:
+            raise IndexError("schedule index out of range")
+        return bool(self._data[self._offset + (s >> 3)] & (0x80 >> (s & 7)))
+
+    def __iter__(self):
+        data, offset = self._data, self._offset
+        for s in range(self._length):
+            yield bool(data[offset + (s >> 3)] & (0x80 >> (s & 7)))
+
+    def transitions(self):
+        """Same as `schedule_transitions` but computed on the packed bits"""
+        n = self._length
+        num_bytes = (n + 7) // 8
+        # bit `n - 1 - s` of `x` is the entry of second `s`
+        x = int.from_bytes(self._data[self._offset:self._offset + num_bytes], 'big') >> (8 * num_bytes - n)
+        diff = (x ^ (x >> 1)) & ((1 << (n - 1)) - 1)
+
+        transitions = []
+        while diff:
+            k = diff.bit_length() - 1
+            transitions.append(n - 1 - k)
+            diff ^= 1 << k
+        return transitions
+
+    def __getstate__(self):
+        return {'filename': self.filename, 'index': self.index}
+
+    def __setstate__(self, d):
+        self.filename = d['filename']
+        self.index = d['index']
+        self._map()
+
+    def __repr__(self):
+        return "PackedSchedule(%s, %d)" % (self.filename, self.index)
+
+
+def schedule_transitions(schedule):
+    """Returns the sorted seconds `s` at which `schedule[s] != schedule[s - 1]` (the online
+    state of the first second and these transitions describe the entire schedule)."""
+    transitions = getattr(schedule, 'transitions', None)
+    if transitions is not None:
+        return transitions()
+    return [s for s, (a, b) in enumerate(zip(schedule, schedule[1:]), 1) if a != b]
+
+
+def write_packed_schedules(bool_schedules, filename):
+    """Writes the schedules (all of the same length) with one bit per entry"""
+    write_packed_int_schedules(
+        ["".join(['1' if x else '0' for x in schedule]) for schedule in bool_schedules], filename)
+
+
+def write_packed_int_schedules(int_schedules, filename):
+    """Same as `write_packed_schedules` for the `"0110..."` strings of the compressed text files"""
+    length = len(int_schedules[0]) if int_schedules else 0
+    num_bytes = (length + 7) // 8
+    with open(filename, 'wb') as f:
+        f.write(_PACKED_HEADER.pack(_PACKED_MAGIC, len(int_schedules), length))
+        for schedule in int_schedules:
+            #opt assert len(schedule) == length
+            f.write(int(schedule + '0' * (8 * num_bytes - length), 2).to_bytes(num_bytes, 'big'))
+
+
+def read_packed_schedules(filename):
+    """Returns a `PackedSchedule` view for each schedule in the packed file"""
+    _, count, _ = _open_packed_schedules(filename)
+    return [PackedSchedule(filename, idx) for idx in range(count)]
+
+
+def convert_compressed_to_packed_schedules(compressed_filename, packed_filename):
+    """Converts the gzipped text schedules (see `read_compressed_int_schedules`) once into a packed file"""
+    write_packed_int_schedules(read_compressed_int_schedules(compressed_filename), packed_filename)
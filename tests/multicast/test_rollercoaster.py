@@ -4,6 +4,7 @@ from unittest.mock import MagicMock
 from simulation.apps import *
 from simulation.multicast.base import *
 from simulation.multicast.rollercoaster import *
+from simulation.simrandom import np
 
 from tests.utils import *
 
@@ -32,7 +33,7 @@ class TestMessagingSession(unittest.TestCase):
 
     def test_init_WHEN_created_THEN_states_set(self):
         self.assertIsNotNone(self.session.schedule.S)
-        self.assertIsNotNone(self.session.schedule.G)
+        self.assertIsNotNone(self.session.schedule.tree)
 
         self.assertSetEqual(set(self.group.users[1:]), set(self.session.state.keys()))
         self.assertListEqual(
@@ -46,36 +47,14 @@ class TestMessagingSession(unittest.TestCase):
         session.set_timeout(10, group.users[1], "role_1")
 
         sim.time = 9
-        self.assertListEqual([], session.get_failed_timeouts(remove=True))
+        self.assertListEqual([], session.timeout_manager.pop_failed(sim.time))
 
         sim.time = 10
         self.assertListEqual(
             [MessagingSession.TimeoutEntry(10, group.users[1], "role_1")],
-            session.get_failed_timeouts(remove=False))
-        self.assertListEqual(
-            [MessagingSession.TimeoutEntry(10, group.users[1], "role_1")],
-            session.get_failed_timeouts(remove=True))
-        self.assertListEqual([], session.get_failed_timeouts(remove=False))
-
-    def test_timeouts_WHEN_set_and_updated_THEN_returns_accordingly(self):
-        sim, session, group = self.sim, self.session, self.group
-        sim.time = 0
-
-        session.set_timeout(10, group.users[1], "role_1")
-
-        sim.time = 9
-        self.assertListEqual([], session.get_failed_timeouts(remove=True))
-
-        session.update_timeout(group.users[1], "role_1", 6)  # extend by new offset (6+9==15)
-
-        sim.time = 10
-        self.assertListEqual([], session.get_failed_timeouts(remove=False))
-
-        sim.time = 15
-        self.assertListEqual(
-            [MessagingSession.TimeoutEntry(15, group.users[1], "role_1")],
-            session.get_failed_timeouts(remove=True))
-        self.assertListEqual([], session.get_failed_timeouts(remove=False))
+            session.timeout_manager.pop_failed(sim.time))
+        self.assertListEqual([], session.timeout_manager.pop_failed(sim.time))
+        self.assertEqual(0, len(session.timeouts))
 
     def test_timeouts_WHEN_set_and_removed_THEN_returns_accordingly(self):
         sim, session, group = self.sim, self.session, self.group
@@ -104,6 +83,63 @@ class TestMessagingSession(unittest.TestCase):
         self.assertEqual(MessagingSession.STATE_DELIVERED, session.state[group.users[1]])
 
 
+class TestTimeoutManager(unittest.TestCase):
+
+    def setUp(self):
+        self.sim = create_test_simulation()
+        self.group = Group("group", self.sim.users)
+
+        self.multicast_mock = MagicMock()
+        self.multicast_mock.group = self.group
+        self.multicast_mock.sim = self.sim
+        self.multicast_mock.k = 1
+
+        self.manager = TimeoutManager()
+        self.sessions = [
+            MessagingSession(self.multicast_mock, self.group.users[0], nonce, "", timeout_manager=self.manager)
+            for nonce in range(2)]
+
+    def test_pop_failed_WHEN_multiple_sessions_THEN_ordered_by_session_and_insertion(self):
+        sim, (s0, s1), users = self.sim, self.sessions, self.group.users
+        sim.time = 0
+        s1.set_timeout(5, users[1], users[1])
+        s0.set_timeout(8, users[2], users[2])
+        s0.set_timeout(3, users[3], users[3])
+        s1.set_timeout(20, users[4], users[4])
+
+        self.assertEqual(3, self.manager.next_deadline())
+        sim.time = 10
+        failed = self.manager.pop_failed(sim.time)
+        self.assertListEqual([(s0, users[2]), (s0, users[3]), (s1, users[1])], [(e.session, e.node) for e in failed])
+        self.assertEqual({}, s0.timeouts)
+        self.assertEqual(20, self.manager.next_deadline())
+
+    def test_pop_failed_WHEN_removed_THEN_skipped_lazily(self):
+        sim, (s0, _), users = self.sim, self.sessions, self.group.users
+        sim.time = 0
+        s0.set_timeout(5, users[1], users[1])
+        s0.set_timeout(12, users[2], users[2])
+        s0.mark_acked(users[1], users[1])
+
+        self.assertEqual(12, self.manager.next_deadline())
+        self.assertListEqual([], self.manager.pop_failed(11))
+        self.assertListEqual([MessagingSession.TimeoutEntry(12, users[2], users[2])], self.manager.pop_failed(12))
+        self.assertIsNone(self.manager.next_deadline())
+
+    def test_next_wakeup_WHEN_timeouts_set_THEN_earliest_deadline(self):
+        sim = create_test_simulation(delta_ms=10)
+        rc_factory = create_factory(RollercoasterStrategy, k=1, timeouts_active=True)
+        app = App("app", sim, Group("group", sim.users), rc_factory)
+        strategy = sim.users[0].multicast[app.group.id]
+        self.assertIsNone(strategy.next_wakeup(sim))
+
+        app.send_payload_to_group(sim.users[0], app._create_payload())
+        sim.run(1_000)  # the payloads are sent and their timeouts set
+        deadlines = [e.deadline for session in strategy.sessions.values() for es in session.timeouts.values() for e in es]
+        self.assertGreater(len(deadlines), 0)
+        self.assertEqual(min(deadlines), strategy.next_wakeup(sim))
+
+
 class TestRollercoasterStrategyIntegration(unittest.TestCase):
 
     def test_WHEN_timeouts_turned_off_THEN_delivered_to_all_except_childs_of_offline(self):
@@ -116,9 +152,9 @@ class TestRollercoasterStrategyIntegration(unittest.TestCase):
         sim.run(50_000)
 
         for u in [sim.users[i] for i in (2, 4, 6)]:
-            self.assertIn((u, payload.nonce), app.seen_deliveries.set)
+            self.assertIn((u, payload.nonce), app.seen_deliveries)
         for u in [sim.users[i] for i in (1, 3, 5)]:
-            self.assertNotIn((u, payload.nonce), app.seen_deliveries.set)
+            self.assertNotIn((u, payload.nonce), app.seen_deliveries)
 
     def test_WHEN_timeouts_turned_on_THEN_delivered_to_all_except_offline_node_itself(self):
         sim = create_test_simulation(delta_ms=10, offline_ids=[1])
@@ -130,6 +166,116 @@ class TestRollercoasterStrategyIntegration(unittest.TestCase):
         sim.run(50_000)
 
         for u in [sim.users[i] for i in (2, 3, 4, 5, 6)]:
-            self.assertIn((u, payload.nonce), app.seen_deliveries.set)
+            self.assertIn((u, payload.nonce), app.seen_deliveries)
+        for u in [sim.users[i] for i in (1,)]:
+            self.assertNotIn((u, payload.nonce), app.seen_deliveries)
+
+    def test_WHEN_event_engine_and_timeouts_turned_on_THEN_delivered_to_all_except_offline_node_itself(self):
+        sim = create_test_simulation(delta_ms=10, offline_ids=[1], engine=ENGINE_EVENT)
+        rc_factory = create_factory(RollercoasterStrategy, k=1, timeouts_active=True)
+        app = App("app", sim, Group("group", sim.users), rc_factory)
+
+        payload = app._create_payload()
+        app.send_payload_to_group(sim.users[0], payload)
+        sim.run(50_000)
+
+        for u in [sim.users[i] for i in (2, 3, 4, 5, 6)]:
+            self.assertIn((u, payload.nonce), app.seen_deliveries)
         for u in [sim.users[i] for i in (1,)]:
-            self.assertNotIn((u, payload.nonce), app.seen_deliveries.set)
+            self.assertNotIn((u, payload.nonce), app.seen_deliveries)
+
+    def test_WHEN_payload_multicast_THEN_schedule_shared_by_group(self):
+        sim = create_test_simulation(delta_ms=10)
+        rc_factory = create_factory(RollercoasterStrategy, k=2, timeouts_active=True)
+        app = App("app", sim, Group("group", sim.users), rc_factory)
+
+        payload = app._create_payload()
+        app.send_payload_to_group(sim.users[0], payload)
+        sim.run(20_000)
+
+        self.assertEqual(len(sim.users) - 1, len(app.seen_deliveries))
+        self.assertEqual(1, len(app.group.schedule_cache))
+        self.assertEqual(1, sim.output.schedule_cache_misses)
+        self.assertEqual(len(sim.users) - 1, sim.output.schedule_cache_hits)  # once per recipient
+        self.assertTrue(all(u.multicast[app.group.id].schedules is app.group.schedule_cache for u in sim.users))
+
+    def test_WHEN_all_members_acked_THEN_session_retired(self):
+        sim = create_test_simulation(delta_ms=10)
+        rc_factory = create_factory(RollercoasterStrategy, k=2, timeouts_active=True)
+        app = App("app", sim, Group("group", sim.users), rc_factory)
+        strategy = sim.users[0].multicast[app.group.id]
+
+        for _ in range(3):
+            app.send_payload_to_group(sim.users[0], app._create_payload())
+        self.assertEqual(3, len(strategy.sessions))
+        sim.run(60_000)
+
+        self.assertEqual({}, strategy.sessions)
+        self.assertIsNone(strategy.next_wakeup(sim))
+        self.assertEqual(0, sim.output.live_sessions)
+        self.assertEqual(3, sim.output.peak_live_sessions)
+        self.assertEqual({MessagingSession.RETIRED_DELIVERED: 3}, sim.output.retired_sessions)
+
+    def test_WHEN_horizon_passed_THEN_session_expired(self):
+        sim = create_test_simulation(delta_ms=10, offline_ids=[1])
+        rc_factory = create_factory(RollercoasterStrategy, k=1, timeouts_active=True, session_horizon_ms=30_000)
+        app = App("app", sim, Group("group", sim.users), rc_factory)
+        strategy = sim.users[0].multicast[app.group.id]
+
+        app.send_payload_to_group(sim.users[0], app._create_payload())
+        sim.run(29_990)
+        self.assertEqual(1, len(strategy.sessions))
+        self.assertLessEqual(strategy.next_wakeup(sim), 30_000)
+
+        sim.run(20)
+        self.assertEqual({}, strategy.sessions)
+        self.assertIsNone(strategy.next_wakeup(sim))
+        self.assertEqual({MessagingSession.RETIRED_EXPIRED: 1}, sim.output.retired_sessions)
+        self.assertEqual(1, sim.output.undelivered_at_retirement)  # the offline user
+
+    def test_WHEN_event_engine_THEN_same_results_as_tick_engine(self):
+        e2e_delays = {}
+        for engine in (ENGINE_TICK, ENGINE_EVENT):
+            sim = create_test_simulation(delta_ms=10, offline_ids=[1], engine=engine)
+            rc_factory = create_factory(RollercoasterStrategy, k=2, timeouts_active=True)
+            app = InteractiveApp("app", sim, Group("group", sim.users), rc_factory, init_rate_per_second=0.5)
+            sim.add_app(app)
+            sim.run(60_000)
+            e2e_delays[engine] = sim.output.e2e_delays[app]
+
+        self.assertGreater(len(e2e_delays[ENGINE_TICK]), 100)
+        self.assertListEqual(e2e_delays[ENGINE_TICK], e2e_delays[ENGINE_EVENT])
+
+    def test_WHEN_fast_forward_THEN_same_results(self):
+        schedule = ([True] * 20 + [False] * 40) * (24 * 60)  # offline 40s every minute
+
+        e2e_delays, skipped_mix_loops = {}, {}
+        for fast_forward in (False, True):
+            sim = create_test_simulation(delta_ms=10, fast_forward=fast_forward)
+            for user in sim.users:
+                user.online_schedule = schedule
+            rc_factory = create_factory(RollercoasterStrategy, k=2, timeouts_active=True)
+            app = InteractiveApp("app", sim, Group("group", sim.users), rc_factory, init_rate_per_second=0.5)
+            sim.add_app(app)
+            sim.run(120_000)
+            e2e_delays[fast_forward] = sim.output.e2e_delays[app]
+            skipped_mix_loops[fast_forward] = sim.output.skipped_mix_loops
+
+        self.assertGreater(len(e2e_delays[False]), 20)
+        self.assertListEqual(e2e_delays[False], e2e_delays[True])
+        self.assertEqual(0, skipped_mix_loops[False])
+        self.assertGreater(skipped_mix_loops[True], 0)
+
+    @unittest.skipIf(np is None, "numpy not installed")
+    def test_WHEN_vectorized_users_THEN_same_results_as_tick_engine(self):
+        e2e_delays = {}
+        for vectorized_users in (False, True):
+            sim = create_test_simulation(delta_ms=10, offline_ids=[1], vectorized_users=vectorized_users)
+            rc_factory = create_factory(RollercoasterStrategy, k=2, timeouts_active=True)
+            app = InteractiveApp("app", sim, Group("group", sim.users), rc_factory, init_rate_per_second=0.5)
+            sim.add_app(app)
+            sim.run(60_000)
+            e2e_delays[vectorized_users] = sim.output.e2e_delays[app]
+
+        self.assertGreater(len(e2e_delays[False]), 100)
+        self.assertListEqual(e2e_delays[False], e2e_delays[True])
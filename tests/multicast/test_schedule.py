@@ -49,6 +49,12 @@ class TestSchedule(unittest.TestCase):
         schedule = Schedule(source=_U[0], all_users=_U, k=2)
         self.assertEqual(schedule.get_next_receiver(6), 0)
 
+    def test_next_receiver_WHEN_nonce_THEN_follows_receive_order(self):
+        schedule = Schedule(source=_U[0], all_users=_U, k=2, nonce=1)
+        receive_order = [0] + [receiver for _, R in schedule.S for _, receiver in R]
+        for idx, u in enumerate(receive_order):
+            self.assertEqual(schedule.get_next_receiver(u), receive_order[(idx + 1) % len(_U)])
+
 
 class TestGraph(unittest.TestCase):
 
@@ -77,3 +83,85 @@ class TestGraph(unittest.TestCase):
         schedule = Schedule(source=_U[0], all_users=_U, k=1)
         estimate = schedule.get_estimated_rtt(2, 6, t_message=10, t_queue=1)
         self.assertEqual(estimate, 10 + 2 + 10 + 1 + 10)
+
+    def test_get_esimated_rtt_WHEN_any_path_THEN_matches_walk_up_the_tree(self):
+        users = list(range(40))
+        schedule = Schedule(source=users[0], all_users=users, k=2, nonce=3)
+        for root in users:
+            for node in schedule.get_recursive_children(root) + [root]:
+                expected, x = 10, node
+                while True:
+                    expected += 10 + 1 * (1 + len(schedule.get_direct_children(x)))
+                    if x == root:
+                        break
+                    x = schedule.get_parents(x)[0]
+                self.assertEqual(schedule.get_estimated_rtt(root, node, t_message=10, t_queue=1), expected)
+
+
+class TestScheduleTree(unittest.TestCase):
+
+    def test_tree_WHEN_k1_THEN_arrays_match_schedule(self):
+        tree = ScheduleTree(n=7, k=1)
+        self.assertListEqual(tree.parent, [-1, 0, 0, 1, 0, 1, 2])
+        self.assertListEqual(tree.depth, [0, 1, 1, 2, 1, 2, 2])
+        self.assertListEqual(tree.direct_children(0), [1, 2, 4])
+        self.assertListEqual(tree.recursive_children(0), [1, 3, 5, 2, 6, 4])
+        self.assertListEqual(tree.recursive_children(1), [3, 5])
+        self.assertTrue(tree.is_leaf(6))
+        self.assertFalse(tree.is_leaf(2))
+
+    def test_schedule_tree_WHEN_same_group_size_THEN_shared(self):
+        s1 = Schedule(source=0, all_users=_U, k=2, nonce=1)
+        s2 = Schedule(source=3, all_users=[x + 10 for x in _U] + [3], k=2, nonce=5)
+        s3 = Schedule(source=0, all_users=_U, k=1)
+
+        self.assertIsNot(s1.tree, s2.tree)  # different group size
+        self.assertIs(s1.tree, Schedule(source=6, all_users=_U, k=2, nonce=4).tree)
+        self.assertIsNot(s1.tree, s3.tree)
+
+    def test_schedule_WHEN_source_not_first_THEN_positions_mapped(self):
+        schedule = Schedule(source=_U[3], all_users=_U, k=2)
+        self.assertListEqual(schedule.order, [3, 0, 1, 2, 4, 5, 6])
+        self.assertListEqual(schedule.get_direct_children(3), [0, 1, 2, 4])
+        self.assertListEqual(schedule.get_recursive_children(0), [5, 6])
+        self.assertEqual(schedule.get_hops_between(3, 6), 2)
+
+
+class TestScheduleCache(unittest.TestCase):
+
+    class OutputMock:
+        def __init__(self):
+            self.schedule_cache_hits, self.schedule_cache_misses = 0, 0
+
+        def log_schedule_cache(self, hit):
+            if hit:
+                self.schedule_cache_hits += 1
+            else:
+                self.schedule_cache_misses += 1
+
+    def test_get_WHEN_same_key_THEN_same_schedule_and_counted(self):
+        output = self.OutputMock()
+        cache = ScheduleCache(_U, output)
+
+        s1 = cache.get(source=0, k=2, nonce=1)
+        s2 = cache.get(source=0, k=2, nonce=1)
+        s3 = cache.get(source=0, k=1, nonce=1)
+
+        self.assertIs(s1, s2)
+        self.assertIsNot(s1, s3)
+        self.assertEqual(s1.S, Schedule(source=0, all_users=_U, k=2, nonce=1).S)
+        self.assertEqual((1, 2), (output.schedule_cache_hits, output.schedule_cache_misses))
+
+    def test_get_WHEN_capacity_exceeded_THEN_least_recently_used_evicted(self):
+        output = self.OutputMock()
+        cache = ScheduleCache(_U, output, capacity=2)
+
+        s0 = cache.get(source=0, k=1, nonce=0)
+        cache.get(source=0, k=1, nonce=1)
+        cache.get(source=0, k=1, nonce=0)  # nonce=1 is now the least recently used
+        cache.get(source=0, k=1, nonce=2)
+        self.assertEqual(2, len(cache))
+
+        self.assertIs(s0, cache.get(source=0, k=1, nonce=0))
+        cache.get(source=0, k=1, nonce=1)
+        self.assertEqual((2, 4), (output.schedule_cache_hits, output.schedule_cache_misses))
@@ -37,9 +37,16 @@ class TestApp(unittest.TestCase):
         self.sim.time = 20
         self.app.on_payload(m.recipient, m, m.body)
 
-        self.assertIn((m.recipient, payload.nonce), self.app.seen_deliveries.set)
+        self.assertIn((m.recipient, payload.nonce), self.app.seen_deliveries)
         self.assertIn((20, 20-11), self.sim.output.e2e_delays[self.app])
 
+    def test_WHEN_cleaned_THEN_seen_deliveries_empty_and_windowed(self):
+        self.app.seen_deliveries.check_and_insert(self.group.users[0], 0)
+        self.app.clean()
+
+        self.assertIsInstance(self.app.seen_deliveries, WindowedSeenSet)
+        self.assertEqual(0, len(self.app.seen_deliveries))
+
     def test_WHEN_create_payload_THEN_new_nonce_every_time(self):
         self.sim.time = 1
         payload_1 = self.app._create_payload()
@@ -101,6 +108,20 @@ class TestInteractiveApp(unittest.TestCase):
         self.assertAlmostEqual(sender_counts[self.users[3]], 1/6*n, delta=1000)  # normal user
         self.assertAlmostEqual(sender_counts[self.users[4]], 1/6*n, delta=1000)  # normal user
 
+    def test_WHEN_users_go_online_or_offline_THEN_sender_index_updated(self):
+        app = self.create_app()
+        self.assertEqual(6, app.online_weights.total())
+
+        self.users[1].set_online(False)
+        self.users[2].set_online(True)
+        self.assertEqual(3, app.online_weights.total())
+        senders = set(app._choose_online_sender() for _ in range(1_000))
+        self.assertSetEqual({self.users[2], self.users[3], self.users[4]}, senders)
+
+        for u in self.users:
+            u.set_online(False)
+        self.assertIsNone(app._choose_online_sender())
+
 
 class TestInteractiveMultimessageApp(unittest.TestCase):
 
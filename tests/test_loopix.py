@@ -25,12 +25,12 @@ class TestLoopixMixNode(unittest.TestCase):
 
         for _ in range(100 // 2):
             sim.tick(sim)
-            self.assertEqual(1, len(mix.inbox.pq))
+            self.assertEqual(1, len(sim.delay_queue))
             self.assertListEqual(node.inbox, [])
 
         sim.tick(sim) # T=102 at end of `tick`
         sim.tick(sim) # T=102 at beginning of tick -> message will be sent
-        self.assertEqual(0, len(mix.inbox.pq))
+        self.assertEqual(0, len(sim.delay_queue))
         self.assertListEqual(node.inbox, [inner_message])
 
     def test_WHEN_multi_message_in_inbox_THEN_forwarded_to_recipients(self):
@@ -47,16 +47,44 @@ class TestLoopixMixNode(unittest.TestCase):
 
         sim.send(node_a, outer_message)
         sim.tick(sim)
-        self.assertEqual(1, len(mix.inbox.pq))
+        self.assertEqual(1, len(sim.delay_queue))
         self.assertListEqual(node_a.inbox, [])
         self.assertListEqual(node_b.inbox, [])
 
         sim.tick(sim)
-        self.assertEqual(0, len(mix.inbox.pq))
+        self.assertEqual(0, len(sim.delay_queue))
         self.assertListEqual(node_a.inbox, [inner_message_a])
         self.assertListEqual(node_b.inbox, [inner_message_b])
 
 
+    def test_WHEN_routed_multi_message_in_inbox_THEN_fans_out_to_recipients(self):
+        mix_a = MixNode('MIX_A', 0, LoopixConfiguration())
+        mix_b = MixNode('MIX_B', 1, LoopixConfiguration())
+        mix_a._send_loop, mix_b._send_loop = MagicMock(), MagicMock()
+
+        node_a = DummySimulationObject('A')
+        node_b = DummySimulationObject('B')
+        sim = create_test_simulation_with(objects=[mix_a, mix_b, node_a, node_b])
+
+        body_a, body_b = Message(node_a, TAG_PAYLOAD, "a"), Message(node_b, TAG_PAYLOAD, "b")
+        outer_message = create_routed_multi_message(
+            chain_prefix=[mix_a, mix_b],
+            chain_suffixes=[[node_a], [node_b]],
+            tags=[TAG_PAYLOAD, TAG_PAYLOAD],
+            bodies=[body_a, body_b],
+            rate_delay_per_seconds=1_000_000,  # (almost) no delay
+            sim=sim,
+        )
+        sim.send(node_a, outer_message)
+
+        for _ in range(4):
+            sim.tick(sim)
+        self.assertEqual(1, len(node_a.inbox))
+        self.assertEqual(1, len(node_b.inbox))
+        self.assertEqual(node_a.inbox[0].unwrap(), body_a)
+        self.assertEqual(node_b.inbox[0].unwrap(), body_b)
+
+
 class TestLoopixUserNode(unittest.TestCase):
 
     def test_WHEN_has_k_messages_THEN_sends_one_multi_message(self):
@@ -123,3 +151,223 @@ class TestLoopixUserNode(unittest.TestCase):
         sim.tick(sim)
         self.assertEqual(len(user.waiting_for_split), 0)
         self.assertEqual(len(provider.inbox), 0)
+
+    def test_WHEN_event_engine_THEN_pulls_at_same_rounds_as_tick_engine(self):
+        schedule = ([True] * 5 + [False] * 7 + [True] * 3) * (24 * 240)
+
+        pull_times = {}
+        for engine in (ENGINE_TICK, ENGINE_EVENT):
+            sim = create_test_simulation(delta_ms=10, users=1, engine=engine)
+            user = sim.users[0]
+            user.online_schedule = schedule
+            user.time_between_pulls = 1_300
+
+            pull_times[engine] = []
+            user._process_inbox = lambda sim, inbox: pull_times[sim.engine].append(sim.time)
+            sim.run(60_000)
+
+        self.assertGreater(len(pull_times[ENGINE_TICK]), 10)
+        self.assertListEqual(pull_times[ENGINE_TICK], pull_times[ENGINE_EVENT])
+
+    def _drop_times_of_first_user(self, users, seed=0):
+        sim = create_test_simulation(delta_ms=10, users=users)
+        sim.rnd = SimRandom(sim, seed=seed)
+        sim.assign_random_streams(sim.objects)
+
+        user, drop_times = sim.users[0], []
+        user._send_drop = lambda sim: drop_times.append(sim.time)
+        sim.run(60_000)
+        return drop_times
+
+    def test_WHEN_other_users_added_THEN_user_draws_same_random_numbers(self):
+        drop_times = self._drop_times_of_first_user(users=1)
+        self.assertGreater(len(drop_times), 10)
+        self.assertListEqual(drop_times, self._drop_times_of_first_user(users=5))
+
+    def test_WHEN_different_seed_THEN_different_random_numbers(self):
+        self.assertNotEqual(self._drop_times_of_first_user(users=1, seed=0),
+                            self._drop_times_of_first_user(users=1, seed=1))
+
+    def test_WHEN_schedule_wraps_around_THEN_next_change_on_next_day(self):
+        sim = create_test_simulation(delta_ms=10, users=1)
+        user = sim.users[0]
+        user.online_schedule = [False] * 100 + [True] * (24 * 3600 - 200) + [False] * 100
+
+        sim.time = 50_000
+        user.online = False
+        self.assertEqual(100_000, user._next_schedule_change(sim))
+
+        sim.time = 24 * 3600_000 - 50_000
+        self.assertEqual(24 * 3600_000 + 100_000, user._next_schedule_change(sim))
+
+        user.online = True
+        self.assertEqual(24 * 3600_000 - 50_000, user._next_schedule_change(sim))
+
+    def test_WHEN_user_offline_THEN_parked_until_schedule_change(self):
+        sim = create_test_simulation(delta_ms=10, users=2, offline_ids=[1])
+        sim.users[0].online_schedule = [True] * 5 + [False] * 10 + [True] * (24 * 3600 - 15)
+        for user in sim.users:
+            user.tick = MagicMock(side_effect=user.tick)
+        sim.run(20_000)
+
+        self.assertEqual(1, sim.users[1].tick.call_count)  # offline all day
+        self.assertEqual(1_000 + 1, sim.users[0].tick.call_count)  # one offline round
+
+    @unittest.skipIf(np is None, "numpy not installed")
+    def test_WHEN_vectorized_users_THEN_only_due_users_ticked(self):
+        sim = create_test_simulation(delta_ms=10, users=3, offline_ids=[2], vectorized_users=True)
+        population = sim.objects[-1]
+        self.assertIsInstance(population, VectorizedUserPopulation)
+
+        sim.run(10)  # all users are due in the first round
+        for user in sim.users:
+            user.tick = MagicMock(side_effect=user.tick)
+        sim.run(20_000)
+
+        self.assertGreater(sim.users[0].tick.call_count, 0)
+        self.assertLess(sim.users[0].tick.call_count, 2_000)  # fewer than all rounds
+        sim.users[2].tick.assert_not_called()  # offline all day
+
+    def test_WHEN_cover_elided_THEN_only_counted(self):
+        sim = create_test_simulation(delta_ms=10, users=3, elide_cover=True)
+        sent = []
+        sim.send = lambda sender, m: sent.append(m)
+        sim.run(10_000)
+
+        self.assertListEqual(sent, [])  # no payload was scheduled
+        self.assertGreater(sim.output.elided_cover[TAG_DROP], 0)
+        self.assertGreater(sim.output.elided_cover[TAG_LOOP], 0)
+
+    def test_WHEN_cover_elided_THEN_payload_sent_alone_in_its_slot(self):
+        sim = create_test_simulation(delta_ms=10, users=2, elide_cover=True)
+        user = sim.users[0]
+        user.set_split(2)
+        sent = []
+        sim.send = lambda sender, m: sent.append(m)
+
+        user._send_payload(sim, Message(recipient=sim.users[1], tag=TAG_PAYLOAD, body=""))
+        user._send_drop(sim)
+        user._send_waiting_split_messages(sim)
+
+        self.assertEqual(1, len(sent))
+        multi_message = sent[0].unwrap().unwrap()  # provider -> first mix -> multiplier
+        self.assertEqual(1, len(multi_message.unwrap()))
+        self.assertEqual(1, sim.output.elided_cover[TAG_DROP])
+
+    def test_WHEN_pulled_THEN_cover_dropped_and_payloads_classified_by_arrival(self):
+        sim = create_test_simulation(delta_ms=10, users=1)
+        user = sim.users[0]
+        provider = user.provider
+
+        received = []
+        user.multicast['g'] = MagicMock()
+        user.multicast['g'].on_receive = lambda m: received.append((m.body, m.get_delivery_online_state()))
+
+        for t, body in ((0, 'early'), (500, 'late')):
+            sim.time = t
+            provider.release(sim, WrappedMessage(provider, TAG_PAYLOAD, ApplicationMessage(user, TAG_PAYLOAD, body, 'g')))
+            provider.release(sim, WrappedMessage(provider, TAG_LOOP, user.loop_message))
+        self.assertEqual(2, len(provider.postboxes[user]))
+
+        sim.time = 1_200  # the early payload arrived before the last pull
+        user._process_inbox(sim, provider.postboxes[user])
+        self.assertListEqual([('early', Message.DELIVERED_OFFLINE), ('late', Message.DELIVERED_ONLINE)], received)
+
+
+class TestLoopixFastForward(unittest.TestCase):
+
+    def test_WHEN_all_users_offline_THEN_jumps_to_next_schedule_change(self):
+        sim = create_test_simulation(delta_ms=10, users=2, fast_forward=True)
+        for user in sim.users:
+            user.online_schedule = [True] * 5 + [False] * 30 + [True] * (24 * 3600 - 35)
+        sim._tick = MagicMock(side_effect=sim._tick)
+        sim.run(60_000)
+
+        # all rounds until the user messages have left the network, then 30s are skipped
+        self.assertEqual(60_000, sim.time)
+        self.assertGreater(sim._tick.call_count, 6_000 - 3_000)
+        self.assertLess(sim._tick.call_count, 6_000 - 2_500)
+        self.assertGreater(sim.output.skipped_mix_loops, 0)
+        self.assertGreater(sum(sim.output.dropped_cover.values()), 0)  # in-flight cover
+        self.assertEqual({}, sim.output.elided_cover)
+
+    def test_WHEN_payload_in_delay_queue_THEN_no_jump(self):
+        sim = create_test_simulation(delta_ms=10, users=2, offline_ids=[0, 1], fast_forward=True)
+        mix = sim.network.layers[0][0]
+        payload = create_routed_message(TAG_PAYLOAD, "", [mix, sim.providers[0]], 0.01, sim)
+        payload.delay = 30_000
+        sim.delay_queue.add(sim, mix, payload)
+        sim._tick = MagicMock(side_effect=sim._tick)
+        sim.run(20_000)
+
+        self.assertEqual(2_000, sim._tick.call_count)
+        self.assertEqual(0, sim.output.skipped_mix_loops)
+
+
+    @unittest.skipIf(np is None, "numpy not installed")
+    def test_WHEN_vectorized_users_THEN_online_count_follows_schedule(self):
+        sim = create_test_simulation(delta_ms=10, users=2, vectorized_users=True, fast_forward=True)
+        for user in sim.users:
+            user.online_schedule = [True] * 5 + [False] * 30 + [True] * (24 * 3600 - 35)
+        sim.run(10_000)
+        self.assertFalse(sim.population.any_online())
+
+        sim.run(40_000)
+        self.assertEqual(50_000, sim.time)
+        self.assertTrue(sim.population.any_online())
+        self.assertGreater(sim.output.skipped_mix_loops, 0)
+
+
+class TestLoopixBufferLevels(unittest.TestCase):
+
+    def _run_with_queued_payloads(self, engine):
+        from simulation.apps import NoOperationApp
+        from simulation.multicast import Group, SequentialUnicastStrategy
+
+        sim = create_test_simulation(delta_ms=10, engine=engine, sample_interval_ms=1_000)
+        app = NoOperationApp("app", sim, Group("group", sim.users), SequentialUnicastStrategy)
+        app.send_payload_to_group(sim.users[0], app._create_payload())
+        sim.run(30_000)
+        return sim
+
+    def test_WHEN_sample_interval_set_THEN_buffer_levels_logged(self):
+        sim = self._run_with_queued_payloads(ENGINE_TICK)
+        levels = sim.output.payload_buffer_levels
+
+        self.assertListEqual(list(range(1_000, 31_000, 1_000)), list(levels.keys()))
+        self.assertTrue(all(len(x) == len(sim.users) for x in levels.values()))
+        self.assertIn(levels[1_000][0], range(1, len(sim.users)))
+        self.assertEqual(0, levels[30_000][0])
+        self.assertEqual(0, sum(levels[1_000][1:]))
+
+    def test_WHEN_event_engine_THEN_same_buffer_levels(self):
+        tick_sim = self._run_with_queued_payloads(ENGINE_TICK)
+        event_sim = self._run_with_queued_payloads(ENGINE_EVENT)
+        self.assertDictEqual(tick_sim.output.payload_buffer_levels, event_sim.output.payload_buffer_levels)
+
+    def test_WHEN_no_sample_interval_THEN_no_buffer_levels(self):
+        sim = create_test_simulation(delta_ms=10)
+        sim.run(5_000)
+        self.assertEqual({}, sim.output.payload_buffer_levels)
+
+
+class TestLoopixEventEngine(unittest.TestCase):
+
+    def test_WHEN_message_with_delay_in_inbox_THEN_forwarded_exactly_after_delay(self):
+        mix = MixNode('MIX', 0, LoopixConfiguration())
+        mix._send_loop = MagicMock()
+
+        node = DummySimulationObject('NODE')
+        sim = create_test_simulation_with(objects=[mix, node], delta_ms=2, engine=ENGINE_EVENT)
+
+        inner_message = WrappedMessage(node, TAG_PAYLOAD, "")
+        outer_message = WrappedMessage(mix, TAG_PAYLOAD, inner_message, delay=100)
+        sim.send(node, outer_message)
+
+        sim.run(102)
+        self.assertEqual(1, len(sim.delay_queue))
+        self.assertListEqual(node.inbox, [])
+
+        sim.run(4)
+        self.assertEqual(0, len(sim.delay_queue))
+        self.assertListEqual(node.inbox, [inner_message])
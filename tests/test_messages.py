@@ -5,6 +5,7 @@ from unittest.mock import MagicMock
 from simulation.messages import *
 from simulation.simrandom import *
 from simulation.simulation import *
+from simulation.utils import traverse_message
 
 from tests.utils import *
 
@@ -70,3 +71,92 @@ class TestMessages(unittest.TestCase):
         self.assertEqual(u4.recipient, 'u4')
         self.assertEqual(u4.tag, TAG_PAYLOAD)
         self.assertEqual(u4.body, 'body2')
+
+    def test_create_routed_multi_message_WHEN_same_seed_THEN_same_hops_as_wrapped_message(self):
+        kwargs = dict(
+            chain_prefix=["p1", "m1", "m2"],
+            chain_suffixes=[
+                ["m3", "u2"],
+                ["m5", "u4"],
+            ],
+            tags=[TAG_DROP, TAG_PAYLOAD],
+            bodies=["body1", "body2"],
+            rate_delay_per_seconds=1,
+            sim=self.sim,
+        )
+        wrapped = create_wrapped_multi_message_multiple(rnd=SimRandom(None, seed=3), **kwargs)
+        routed = create_routed_multi_message(rnd=SimRandom(None, seed=3), **kwargs)
+        self.assertIsInstance(routed, RoutedMessage)
+
+        def hops(m):
+            return [(m.recipient, m.tag, m.delay) for m in traverse_message(m)]
+
+        self.assertListEqual(hops(wrapped), hops(routed))
+
+        # the views carry the final body (or the branches before the fan-out) instead of the
+        # next wrapped message
+        bodies = [m.body if isinstance(m.body, str) else len(m.body) for m in traverse_message(routed)]
+        self.assertListEqual([2, 2, 2, 'body1', 'body1', 'body2', 'body2'], bodies)
+
+    def test_routed_message_WHEN_forwarded_THEN_advances_in_place_and_fans_out(self):
+        m = create_routed_multi_message(
+            chain_prefix=["p1", "m1"],
+            chain_suffixes=[["m3", "u2"], ["m5", "u4"]],
+            tags=[TAG_DROP, TAG_PAYLOAD],
+            bodies=["body1", "body2"],
+            rate_delay_per_seconds=1,
+            sim=self.sim
+        )
+
+        self.assertEqual(m.recipient, 'p1')
+        self.assertEqual((m,), m.forward())
+        self.assertEqual(m.recipient, 'm1')
+        self.assertEqual(m.delay, m.delays[1])
+
+        m3, m5 = m.forward()
+        self.assertEqual(m3.recipient, 'm3')
+        self.assertEqual(m5.recipient, 'm5')
+        self.assertEqual((m5,), m5.forward())
+        self.assertEqual(m5.recipient, 'u4')
+        self.assertEqual(m5.delay, 0)
+        self.assertEqual((), m5.forward())  # the body is not a message
+
+    def test_routed_message_WHEN_online_state_set_THEN_propagated_to_branches(self):
+        inner = Message('u2', TAG_PAYLOAD, 'body')
+        m = create_routed_multi_message(
+            chain_prefix=["p1", "m1"],
+            chain_suffixes=[["m3", "p2"]],
+            tags=[TAG_PAYLOAD],
+            bodies=[inner],
+            rate_delay_per_seconds=1,
+            sim=self.sim
+        )
+
+        m.set_deliver_online_state(Message.DELIVERED_OFFLINE)
+        self.assertEqual(Message.DELIVERED_OFFLINE, inner.get_delivery_online_state())
+
+    def test_message_WHEN_pickling_slots_THEN_all_fields_restored(self):
+        m = RoutedMessage(TAG_PAYLOAD, Message('u', TAG_PAYLOAD, 'body'), ['p1', 'm1'], [10, 20])
+        m.forward()
+        m2 = pickle.loads(pickle.dumps(m))
+
+        self.assertEqual((m2.recipient, m2.tag, m2.delay, m2.hop), ('m1', TAG_PAYLOAD, 20, 1))
+        self.assertListEqual(m2.route, ['p1', 'm1'])
+        self.assertEqual(m2.body.body, 'body')
+        self.assertEqual(m2.callback, nop)
+
+    def test_message_WHEN_unpickling_tag_name_THEN_integer_tag(self):
+        m = Message('recipient', TAG_DROP, 'body')
+        m2 = Message.__new__(Message)
+        m2.__setstate__({'recipient': 'recipient', 'tag': 'drop', 'body': 'body'})
+
+        self.assertEqual(m2.tag, TAG_DROP)
+        self.assertEqual(repr(m), "[recipient, drop, body]")
+
+    def test_cover_message_WHEN_delivered_THEN_unchanged(self):
+        m = CoverMessage('recipient', TAG_LOOP)
+        m.set_deliver_online_state(Message.DELIVERED_ONLINE)
+        m.fire_callback_and_reset()
+
+        self.assertIsNone(m.get_delivery_online_state())
+        self.assertFalse(hasattr(m, '__dict__'))
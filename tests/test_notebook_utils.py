@@ -2,6 +2,7 @@ import unittest
 from unittest.mock import call, MagicMock
 
 from simulation.notebook_utils import *
+from simulation.simulation import ENGINE_EVENT
 
 
 class TestNotebookUtils(unittest.TestCase):
@@ -16,6 +17,13 @@ class TestNotebookUtils(unittest.TestCase):
         self.assertEqual(1337, sim.config.user_rate_pull)
         self.assertEqual(1338, sim.apps[0].init_rate_per_second)
 
+    def test_notebook_sim_config_WHEN_sim_kwargs_THEN_passed_to_simulation(self):
+        notebook_sim_config = NotebookSimulationConfig(app_kwargs={'init_rate_per_second': 1}).derive_new(
+            delta_sim_kwargs={'engine': ENGINE_EVENT})
+
+        sim = create_scenario(16, [16], notebook_sim_config, 'unicast', 1_000)
+        self.assertTrue(sim.event_driven)
+
     def test_get_name_WHEN_create_scenario_THEN_information_in_name(self):
         notebook_sim_config = NotebookSimulationConfig(app_kwargs={'init_rate_per_second': 1338},)
         sim = create_scenario(16, [16, 8, 4], notebook_sim_config, 'unicast', 1_000)
@@ -1,3 +1,5 @@
+import math
+import pickle
 import statistics
 import unittest
 
@@ -10,10 +12,14 @@ class SimulationMock:
 
 
 class TestSimrandom(unittest.TestCase):
+    backend = BACKEND_PYTHON
+
+    def create_random(self, sim):
+        return SimRandom(sim, backend=self.backend)
 
     def _test_poisson_event(self, rate, n=500_000):
         sim = SimulationMock(delta_seconds=0.002)  # 2ms
-        r = SimRandom(sim)
+        r = self.create_random(sim)
 
         cnt = 0
         for _ in range(n):
@@ -35,7 +41,7 @@ class TestSimrandom(unittest.TestCase):
         self._test_poisson_event(10)
 
     def test_poisson_delay_WHEN_rate_THEN_matches_expected_value(self):
-        r = SimRandom(SimulationMock())
+        r = self.create_random(SimulationMock())
 
         rate, n = 2, 100_000
         delays = [r.poisson_delay(rate) for _ in range(n)]
@@ -51,7 +57,7 @@ class TestSimrandom(unittest.TestCase):
         )
 
     def test_random_shuffle_WHEN_given_list_THEN_original_list_not_modified(self):
-        r = SimRandom(SimulationMock())
+        r = self.create_random(SimulationMock())
 
         l = [0, 1, 2, 3, 4]
         l2 = r.shuffle(l)
@@ -59,7 +65,7 @@ class TestSimrandom(unittest.TestCase):
         self.assertNotEqual(l, l2)
 
     def test_coin_WHEN_given_fair_coin_THEN_50_50(self):
-        r, n = SimRandom(SimulationMock()), 10_000
+        r, n = self.create_random(SimulationMock()), 10_000
 
         throws = [r.coin(p=0.5) for _ in range(n)]
         num_heads = sum(1 if c else 0 for c in throws)
@@ -67,7 +73,7 @@ class TestSimrandom(unittest.TestCase):
         self.assertAlmostEqual(num_heads, n/2, delta=100)
 
     def test_sample_WHEN_given_numbers_THEN_average_close_to_average(self):
-        r, n, k = SimRandom(SimulationMock()), 100_000, 2
+        r, n, k = self.create_random(SimulationMock()), 100_000, 2
 
         arr = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]
         s = sum([sum(r.sample(arr, k)) for _ in range(n)])
@@ -75,7 +81,7 @@ class TestSimrandom(unittest.TestCase):
         self.assertAlmostEqual(s/k, n*statistics.mean(arr), delta=1000)
 
     def test_choice_with_weights_WHEN_weights_same_THEN_average_is_average(self):
-        r, n = SimRandom(SimulationMock()), 100_000
+        r, n = self.create_random(SimulationMock()), 100_000
 
         arr = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]
         weights = [1, 1, 1, 1, 1, 1, 1, 1, 1, 1]
@@ -85,7 +91,7 @@ class TestSimrandom(unittest.TestCase):
         self.assertAlmostEqual(avg, statistics.mean(arr), delta=0.01)
 
     def test_choice_with_weights_WHEN_one_item_higher_THEN_average_is_average_of_representative_arr(self):
-        r, n = SimRandom(SimulationMock()), 100_000
+        r, n = self.create_random(SimulationMock()), 100_000
 
         arr = [1, 2, 3]
         weights = [1, 1, 3]
@@ -95,3 +101,165 @@ class TestSimrandom(unittest.TestCase):
         actual_arr = [1, 2, 3, 3, 3]
         self.assertAlmostEqual(avg, statistics.mean(actual_arr), delta=0.01)
 
+
+    def _test_poisson_process(self, rate, n=500_000):
+        sim = SimulationMock(delta_seconds=0.002)  # 2ms
+        sim.delta_ms, sim.time = 2, 0
+        process = self.create_random(sim).poisson_process(rate)
+
+        cnt = 0
+        for _ in range(n):
+            cnt += 1 if process.fires(sim) else 0
+            sim.time += sim.delta_ms
+
+        self.assertAlmostEqual(
+            first=cnt/(sim.delta_seconds*n),
+            second=rate,
+            delta=0.15*rate  # allow 15% error
+        )
+
+    def test_poisson_process_WHEN_rate_less_one_THEN_matches_excpected_value(self):
+        self._test_poisson_process(0.1)
+
+    def test_poisson_process_WHEN_rate_greater_one_THEN_matches_excpected_value(self):
+        self._test_poisson_process(10)
+
+    def test_poisson_process_WHEN_rate_zero_THEN_never_fires(self):
+        sim = SimulationMock(delta_seconds=0.01)
+        sim.delta_ms, sim.time = 10, 0
+        process = self.create_random(sim).poisson_process(0)
+
+        self.assertFalse(any(process.fires(sim) for _ in range(1000)))
+
+    def test_poisson_process_WHEN_not_polled_for_a_while_THEN_still_matches_expected_value(self):
+        sim = SimulationMock(delta_seconds=0.01)
+        sim.delta_ms, sim.time = 10, 0
+        rate, n = 5, 200_000
+        process = self.create_random(sim).poisson_process(rate)
+
+        # only every other second is polled (e.g. the owner is offline in-between)
+        cnt, polled = 0, 0
+        for _ in range(n):
+            if (sim.time // 1000) % 2 == 0:
+                cnt += 1 if process.fires(sim) else 0
+                polled += 1
+            sim.time += sim.delta_ms
+
+        self.assertAlmostEqual(cnt/(sim.delta_seconds*polled), rate, delta=0.1*rate)
+
+    def test_superposed_poisson_process_WHEN_polled_THEN_each_flag_is_bernoulli_per_round(self):
+        sim = SimulationMock(delta_seconds=0.01)
+        sim.delta_ms, sim.time = 10, 0
+        rates, n = (40, 0, 5), 200_000
+        process = self.create_random(sim).superposed_poisson_process(rates)
+
+        cnt, both = [0] * len(rates), 0
+        for _ in range(n):
+            fired = process.fires(sim) or [False] * len(rates)
+            for idx, f in enumerate(fired):
+                cnt[idx] += 1 if f else 0
+            both += 1 if fired[0] and fired[2] else 0
+            sim.time += sim.delta_ms
+
+        # at most one event per round and duty (i.e. not `rate * delta`)
+        p = [1 - math.exp(-rate * sim.delta_seconds) for rate in rates]
+        for idx in range(len(rates)):
+            self.assertAlmostEqual(cnt[idx] / n, p[idx], delta=0.05 * p[idx])
+        self.assertAlmostEqual(both / n, p[0] * p[2], delta=0.1 * p[0] * p[2])
+
+    def test_superposed_poisson_process_WHEN_rates_zero_THEN_never_fires(self):
+        sim = SimulationMock(delta_seconds=0.01)
+        sim.delta_ms, sim.time = 10, 0
+        process = self.create_random(sim).superposed_poisson_process((0, 0))
+
+        self.assertFalse(any(process.fires(sim) for _ in range(1000)))
+
+    def test_substream_WHEN_same_key_THEN_same_stream(self):
+        a = SimRandom(None, seed=3, backend=self.backend).substream("u001")
+        b = SimRandom(None, seed=3, backend=self.backend).substream("u001")
+        self.assertListEqual([a.coin(0.5) for _ in range(64)], [b.coin(0.5) for _ in range(64)])
+
+    def test_substream_WHEN_different_key_or_seed_THEN_different_stream(self):
+        r = SimRandom(None, seed=3, backend=self.backend)
+        a, b = r.substream("u001"), r.substream("u002")
+        c = SimRandom(None, seed=4, backend=self.backend).substream("u001")
+        a_values = [a.coin(0.5) for _ in range(64)]
+        self.assertNotEqual(a_values, [b.coin(0.5) for _ in range(64)])
+        self.assertNotEqual(a_values, [c.coin(0.5) for _ in range(64)])
+
+    def test_substream_WHEN_parent_used_THEN_substream_unaffected(self):
+        r1, r2 = SimRandom(None, seed=3, backend=self.backend), SimRandom(None, seed=3, backend=self.backend)
+        r1.coin(0.5)
+        a, b = r1.substream("u001"), r2.substream("u001")
+        self.assertListEqual([a.coin(0.5) for _ in range(64)], [b.coin(0.5) for _ in range(64)])
+
+    def test_batched_draws_WHEN_compared_to_single_draws_THEN_same_numbers(self):
+        a, b = SimRandom(None, seed=5, backend=self.backend), SimRandom(None, seed=5, backend=self.backend)
+        seqs = [list(range(n)) for n in (1, 3, 7, 100)] * 50
+
+        for _ in range(10):
+            self.assertListEqual([a.choice(seq) for seq in seqs], b.choice_each(seqs))
+            self.assertListEqual([a.poisson_delay(2.5) for _ in range(300)], b.poisson_delays(2.5, 300))
+        self.assertListEqual([], b.poisson_delays(2.5, 0))
+
+
+@unittest.skipIf(np is None, "numpy not installed")
+class TestSimrandomNumpy(TestSimrandom):
+    backend = BACKEND_NUMPY
+
+    def test_numpy_source_WHEN_same_seed_THEN_same_stream_regardless_of_block_size(self):
+        a, b = NumpyRandomSource(seed=42), NumpyRandomSource(seed=42, block_size=7)
+
+        # interleaving the calls does not change the individual streams
+        a_values = [a.random() for _ in range(100)] + [a.expovariate(2) for _ in range(100)]
+        b_values = []
+        for _ in range(100):
+            b_values.append(b.random())
+        b_exp = [b.expovariate(2) for _ in range(100)]
+
+        self.assertListEqual(a_values, b_values + b_exp)
+
+    def test_numpy_source_WHEN_different_seed_THEN_different_stream(self):
+        a, b = NumpyRandomSource(seed=1), NumpyRandomSource(seed=2)
+        self.assertNotEqual([a.random() for _ in range(10)], [b.random() for _ in range(10)])
+
+    def test_numpy_source_WHEN_sample_THEN_distinct_elements_of_population(self):
+        r = NumpyRandomSource(seed=0)
+        for _ in range(1000):
+            s = r.sample(range(10), 4)
+            self.assertEqual(4, len(set(s)))
+            self.assertTrue(all(0 <= x < 10 for x in s))
+
+    def test_numpy_source_WHEN_pickled_THEN_continues_at_next_block(self):
+        a = NumpyRandomSource(seed=42, block_size=10)
+        expected = [a.random() for _ in range(30)]
+
+        b = NumpyRandomSource(seed=42, block_size=10)
+        b_values = [b.random() for _ in range(5)]
+        b = pickle.loads(pickle.dumps(b))
+        b_values += [b.random() for _ in range(10)]
+
+        self.assertListEqual(expected[:5] + expected[10:20], b_values)
+
+    def test_numpy_source_WHEN_many_substreams_THEN_small_footprint(self):
+        import tracemalloc
+
+        r = self.create_random(SimulationMock())
+        tracemalloc.start()
+        substreams = [r.substream("user_%d" % i) for i in range(100)]
+        for s in substreams:
+            s.coin(0.5)
+            s.poisson_delay(1)
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        # a full block of 1<<16 floats alone would be several MB per substream
+        self.assertLess(size / len(substreams), 100_000)
+
+    def test_numpy_source_WHEN_blocks_grow_THEN_same_stream_and_capped_at_block_size(self):
+        a = NumpyRandomSource(seed=42, block_size=1000, initial_block_size=10)
+        b = NumpyRandomSource(seed=42, block_size=7)
+        self.assertListEqual([b.random() for _ in range(5000)], [a.random() for _ in range(5000)])
+
+        sizes = [len(block) for block, _ in zip(a._blocks(a._uniform_generator.random), range(10))]
+        self.assertListEqual([10, 20, 40, 80, 160, 320, 640, 1000, 1000, 1000], sizes)
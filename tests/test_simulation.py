@@ -35,6 +35,30 @@ class TestSimulation(unittest.TestCase):
         sim.tick(sim)
         o2.deliver.assert_called_with(sim, m)
 
+    def test_simulation_WHEN_messages_to_several_recipients_THEN_delivered_in_bulk_per_recipient(self):
+        o1, o2 = SimulationObject('o1'), SimulationObject('o2')
+        delivered = []
+        for o in (o1, o2):
+            o.tick = MagicMock()
+            o.deliver_many = lambda sim, ms, o=o: delivered.append((o, list(ms)))
+        sim = Simulation('', [o1, o2], SimulationOutput(log_level=None))
+
+        m1, m2, m3 = Message(o2, TAG_PAYLOAD, 1), Message(o1, TAG_PAYLOAD, 2), Message(o2, TAG_PAYLOAD, 3)
+        for m in (m1, m2, m3):
+            sim.send(o1, m)
+        sim.tick(sim)
+        self.assertListEqual([(o2, [m1, m3]), (o1, [m2])], delivered)
+
+        # the buffers are kept and reused in the next rounds
+        buffer = sim.messages_in_transit[o2]
+        m4 = Message(o2, TAG_PAYLOAD, 4)
+        sim.send(o1, m4)
+        sim.tick(sim)
+        sim.tick(sim)
+        self.assertListEqual([(o2, [m1, m3]), (o1, [m2]), (o2, [m4])], delivered)
+        self.assertIs(buffer, sim.messages_in_transit[o2])
+        self.assertListEqual([], sim.transit_recipients)
+
     def test_simulation_WHEN_app_messages_THEN_get_by_tag_correct(self):
         o1 = SimulationObject('o1')
         o1.deliver, o1.tick = MagicMock(), MagicMock()
@@ -54,3 +78,31 @@ class TestSimulation(unittest.TestCase):
         sim._tick = MagicMock()
         sim.run(time_ms=3000)
         self.assertEqual(150, sim._tick.call_count)
+
+    def test_simulation_WHEN_event_engine_THEN_only_due_objects_ticked(self):
+        o1, o2 = SimulationObject('o1'), SimulationObject('o2')
+        o1.tick, o2.tick = MagicMock(), MagicMock()
+        o1.next_wakeup = lambda sim: sim.time  # every round
+        o2.next_wakeup = lambda sim: (sim.time // 100 + 1) * 100  # every 100ms
+
+        sim = Simulation('', [o1, o2], SimulationOutput(log_level=None), delta_ms=10, engine=ENGINE_EVENT)
+        sim.run(time_ms=1000)
+
+        self.assertEqual(100, o1.tick.call_count)
+        self.assertEqual(10, o2.tick.call_count)
+        self.assertEqual(1000, sim.time)
+
+    def test_simulation_WHEN_event_engine_and_message_delivered_THEN_recipient_woken_up(self):
+        o1, o2 = SimulationObject('o1'), SimulationObject('o2')
+        o1.tick, o1.next_wakeup = MagicMock(), lambda sim: None
+        o2.tick, o2.deliver = MagicMock(), MagicMock()
+        o2.next_wakeup = lambda sim: sim.time if o2.deliver.called and o2.tick.call_count < 2 else None
+
+        sim = Simulation('', [o1, o2], SimulationOutput(log_level=None), delta_ms=10, engine=ENGINE_EVENT)
+        o1.tick.side_effect = lambda sim: sim.send(o1, Message(o2, TAG_PAYLOAD, 'body'))
+        sim.run(time_ms=1000)
+
+        # both are ticked in the first round, but only o2 is woken up after the delivery
+        self.assertEqual(1, o1.tick.call_count)
+        self.assertEqual(2, o2.tick.call_count)
+        o2.deliver.assert_called_once()
@@ -1,5 +1,8 @@
 from simulation.messages import TAG_PAYLOAD
-from tests.utils import create_test_simulation
+from tests.utils import create_test_simulation, create_test_simulation_with, DummySimulationObject
+import os
+import pickle
+import random
 import unittest
 from unittest.mock import call, MagicMock
 
@@ -28,6 +31,33 @@ class TestHelperMethods(unittest.TestCase):
         func.assert_has_calls([call(10), call(11), call(12)])
 
 
+class TestFenwickTree(unittest.TestCase):
+
+    def test_WHEN_updated_THEN_total_and_find_follow_weights(self):
+        tree = FenwickTree([1, 0, 4, 1, 0])
+        self.assertEqual(6, tree.total())
+        self.assertListEqual([0, 2, 2, 2, 2, 3], [tree.find(r) for r in range(6)])
+
+        tree.update(2, 0)
+        tree.update(4, 2)
+        self.assertEqual(4, tree.total())
+        self.assertListEqual([0, 3, 4, 4], [tree.find(r) for r in range(4)])
+        self.assertEqual(4, tree.find(3.999))
+
+    def test_WHEN_many_weights_THEN_matches_prefix_sums(self):
+        r = random.Random(1)
+        weights = [r.choice([0, 1, 4]) for _ in range(100)]
+        tree = FenwickTree(weights)
+        for _ in range(200):
+            idx, w = r.randrange(100), r.choice([0, 1, 4])
+            weights[idx] = w
+            tree.update(idx, w)
+
+            x = r.random() * sum(weights)
+            expected = next(i for i in range(100) if sum(weights[:i + 1]) > x)
+            self.assertEqual(expected, tree.find(x))
+
+
 class TestHasSeenSet(unittest.TestCase):
 
     def test_WHEN_not_seen_THEN_false(self):
@@ -47,43 +77,50 @@ class TestHasSeenSet(unittest.TestCase):
         self.assertFalse(s.check_and_insert("b"))
 
 
-class TestMessageDelayingBox(unittest.TestCase):
-
-    def setUp(self):
-        self.b = MessageDelayingBox()
-        self.sim = create_test_simulation()
-
-    def tick(self):
-        self.b.tick(self.sim)
-        self.sim.tick(self.sim)
-
-    def test_WHEN_empty_THEN_returns_empty(self):
-        self.assertListEqual([], self.b.pop_current_round(self.sim))
-        self.assertListEqual([], self.b.pop_current_round(self.sim))
-
-    def test_WHEN_given_messages_THEN_returned_in_delay_order(self):
-        m3 = WrappedMessage(None, TAG_PAYLOAD, None, delay=3)
-        m2a = WrappedMessage(None, TAG_PAYLOAD, None, delay=2)
-        m5 = WrappedMessage(None, TAG_PAYLOAD, None, delay=5)
-        m2b = WrappedMessage(None, TAG_PAYLOAD, None, delay=2)
-
-        for m in (m3, m2a, m5, m2b):
-            self.b.add(self.sim, m)
-
-        self.tick()
-        self.assertListEqual([], self.b.pop_current_round(self.sim))
-
-        self.tick()
-        self.assertListEqual([m2a, m2b], self.b.pop_current_round(self.sim))
-
-        self.tick()
-        self.assertListEqual([m3], self.b.pop_current_round(self.sim))
-
-        self.tick()
-        self.assertListEqual([], self.b.pop_current_round(self.sim))
+class TestWindowedSeenSet(unittest.TestCase):
 
-        self.tick()
-        self.assertListEqual([m5], self.b.pop_current_round(self.sim))
+    def test_WHEN_seen_THEN_true(self):
+        s = WindowedSeenSet()
+        self.assertFalse(s.check_and_insert("a", 1))
+        self.assertFalse(s.check_and_insert("b", 1))
+        self.assertTrue(s.check_and_insert("a", 1))
+        self.assertIn(("b", 1), s)
+        self.assertNotIn(("b", 2), s)
+        self.assertEqual(2, len(s))
+
+    def test_WHEN_out_of_order_beyond_window_THEN_same_answers_as_set(self):
+        r = random.Random(0)
+        s, reference = WindowedSeenSet(window=8), set()
+        for i in range(5_000):
+            stream = r.randrange(4)
+            nonce = r.randrange(10_000) if r.random() < 0.1 else max(0, int(r.gauss(2 * i, 20)))
+            self.assertEqual((stream, nonce) in reference, s.check_and_insert(stream, nonce))
+            reference.add((stream, nonce))
+        self.assertEqual(len(reference), len(s))
+
+    def test_WHEN_nonces_in_order_THEN_only_watermark_kept(self):
+        s = WindowedSeenSet(window=16)
+        nonces = list(range(10_000))
+        for idx in range(0, len(nonces), 10):
+            chunk = nonces[idx:idx + 10]
+            random.Random(idx).shuffle(chunk)
+            for nonce in chunk:
+                s.check_and_insert("a", nonce)
+
+        stream = s.streams["a"]
+        self.assertEqual(10_000, stream.watermark)
+        self.assertEqual((0, []), (stream.bits, stream.gap_starts))
+
+    def test_WHEN_nonce_skipped_THEN_kept_as_gap(self):
+        s = WindowedSeenSet(window=4)
+        for nonce in [0, 1, 3, 10, 11, 12]:
+            s.check_and_insert("a", nonce)
+
+        stream = s.streams["a"]
+        self.assertEqual(([2, 4], [3, 9]), (stream.gap_starts, stream.gap_ends))
+        self.assertFalse(s.check_and_insert("a", 5))
+        self.assertTrue(s.check_and_insert("a", 5))
+        self.assertEqual(([2, 4, 6], [3, 5, 9]), (stream.gap_starts, stream.gap_ends))
 
 
 class TestReadWriteSchedules(unittest.TestCase):
@@ -131,3 +168,109 @@ class TestReadWriteSchedules(unittest.TestCase):
         actual = read_compressed_bool_schedules(self.get_filename())
 
         self.assertListEqual(bool_schedules, actual)
+
+
+class TestPackedSchedules(unittest.TestCase):
+
+    def get_filename(self):
+        return "/tmp/python_test_for_loopix_test.bin"
+
+    def test_read_write_packed(self):
+        schedules = [
+            [False] * 9,
+            [True] * 9,
+            [True, False, True, True, False, False, False, True, True],
+        ]
+
+        write_packed_schedules(schedules, self.get_filename())
+        actual = read_packed_schedules(self.get_filename())
+
+        self.assertListEqual(schedules, [list(s) for s in actual])
+        self.assertTrue(actual[2][8])
+        self.assertFalse(actual[2][6])
+        self.assertEqual(9, len(actual[0]))
+        with self.assertRaises(IndexError):
+            actual[0][9]
+
+    def test_WHEN_converted_from_compressed_THEN_same_as_bool_schedules(self):
+        write_compressed_int_schedules(["0110", "1001"], "/tmp/python_test_for_loopix_test.tmp")
+        convert_compressed_to_packed_schedules("/tmp/python_test_for_loopix_test.tmp", self.get_filename())
+
+        actual = read_packed_schedules(self.get_filename())
+        self.assertListEqual([[False, True, True, False], [True, False, False, True]], [list(s) for s in actual])
+
+    def test_WHEN_pickled_THEN_only_reference_stored(self):
+        write_packed_schedules([[True] * 1000, [False] * 1000], self.get_filename())
+        schedule = read_packed_schedules(self.get_filename())[1]
+
+        data = pickle.dumps(schedule)
+        self.assertLess(len(data), 200)
+        self.assertListEqual([False] * 1000, list(pickle.loads(data)))
+
+    def test_WHEN_relative_filename_THEN_unpickled_from_other_directory(self):
+        cwd = os.getcwd()
+        try:
+            os.chdir(os.path.dirname(self.get_filename()))
+            write_packed_schedules([[True, False]], os.path.basename(self.get_filename()))
+            data = pickle.dumps(read_packed_schedules(os.path.basename(self.get_filename()))[0])
+
+            os.chdir("/")
+            self.assertListEqual([True, False], list(pickle.loads(data)))
+        finally:
+            os.chdir(cwd)
+
+    def test_WHEN_transitions_THEN_same_for_packed_and_bool_schedules(self):
+        schedules = [
+            [False] * 20,
+            [True] * 3 + [False] * 10 + [True] * 7,
+            [False, True] * 10,
+        ]
+        write_packed_schedules(schedules, self.get_filename())
+
+        for schedule, packed in zip(schedules, read_packed_schedules(self.get_filename())):
+            self.assertListEqual(schedule_transitions(schedule), packed.transitions())
+
+        self.assertListEqual([], schedule_transitions(schedules[0]))
+        self.assertListEqual([3, 13], schedule_transitions(schedules[1]))
+
+
+class TestCalendarQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.sim = create_test_simulation_with(objects=[], delta_ms=2)
+        self.q = CalendarQueue()
+        self.node = DummySimulationObject('NODE')
+        self.node.release = lambda sim, m: self.released.append((sim.time, m))
+        self.released = []
+
+    def test_WHEN_empty_THEN_nothing_released(self):
+        self.q.release(self.sim)
+        self.assertIsNone(self.q.next_round())
+        self.assertListEqual([], self.released)
+
+    def test_WHEN_given_messages_THEN_released_in_first_round_after_deadline_in_delay_order(self):
+        m3 = WrappedMessage(None, TAG_PAYLOAD, None, delay=3)
+        m2 = WrappedMessage(None, TAG_PAYLOAD, None, delay=2)
+        m4 = WrappedMessage(None, TAG_PAYLOAD, None, delay=3.5)
+        for m in (m4, m3, m2):
+            self.q.add(self.sim, self.node, m)
+
+        self.assertEqual(3, len(self.q))
+        self.assertEqual(2, self.q.next_round())
+
+        for _ in range(3):
+            self.q.release(self.sim)
+            self.sim.time += self.sim.delta_ms
+
+        self.assertListEqual([(2, m2), (4, m3), (4, m4)], self.released)
+        self.assertEqual(0, len(self.q))
+
+    def test_WHEN_added_in_bulk_THEN_same_as_added_one_by_one(self):
+        ms = [WrappedMessage(None, TAG_PAYLOAD, None, delay=d) for d in (3, 2, 3.5, 2)]
+        self.q.add_many(self.sim, self.node, ms)
+
+        other = CalendarQueue()
+        for m in ms:
+            other.add(self.sim, self.node, m)
+        self.assertDictEqual(other.buckets, self.q.buckets)
+        self.assertListEqual(other.rounds, self.q.rounds)
@@ -18,7 +18,8 @@ class DummySimulationObject(SimulationObject):
         pass
 
 
-def create_test_simulation(delta_ms=1, users=7, offline_ids=[], output=False):
+def create_test_simulation(delta_ms=1, users=7, offline_ids=[], output=False, **sim_kwargs):
+    """The `sim_kwargs` are passed to `create_loopix_simulation` (e.g. `engine`)"""
     sim_output = SimulationOutput(log_level=1 if output else 999)
 
     num_entries_schedule = 24 * 60 * 60
@@ -33,6 +34,7 @@ def create_test_simulation(delta_ms=1, users=7, offline_ids=[], output=False):
         delta_ms=delta_ms,
         output=sim_output,
         online_schedules=schedules,
+        **sim_kwargs,
     )
 
     # EXAMPLE: how to add new methods to the test object
@@ -44,7 +46,7 @@ def create_test_simulation(delta_ms=1, users=7, offline_ids=[], output=False):
     return sim
 
 
-def create_test_simulation_with(objects, delta_ms=1, output=False):
+def create_test_simulation_with(objects, delta_ms=1, output=False, engine=ENGINE_TICK):
     sim = create_loopix_simulation(
         providers=0,
         users_per_provider=(0, 0),
@@ -52,8 +54,10 @@ def create_test_simulation_with(objects, delta_ms=1, output=False):
         mix_scale=0,
         delta_ms=delta_ms,
         output=SimulationOutput(log_level=1 if output else 999),
+        engine=engine,
     )
     sim.objects = objects
+    sim.assign_random_streams(objects)
     return sim
 
 